@@ -0,0 +1,43 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.auth import hasher
+from app.avatars import variant_cache_stats
+from app.cache import user_cache_stats
+from app import database
+from app.database import get_db
+from app.outbox import queue_status, worker as mail_worker
+from app.deps import require_admin
+from app.ratelimit import rate_limit_stats
+from app.revocation import revocation_stats
+from app.tokens import token_cache_stats
+
+router = APIRouter(
+    prefix="/admin",
+    tags=["admin"],
+    dependencies=[Depends(require_admin)],
+)
+
+
+@router.get("/metrics")
+async def metrics(db: AsyncSession = Depends(get_db)):
+    """
+    Повертає внутрішні лічильники застосунку для адміністраторів.
+
+    :param db: Сесія БД (глибина черги пошти).
+    :return: JSON зі статистикою кешу користувачів, пулу bcrypt, пулу з'єднань БД,
+        лімітів запитів і черги пошти.
+    """
+    result = {
+        "user_cache": user_cache_stats(),
+        "password_hasher": hasher.stats(),
+        "db_pool": database.pool_status(),
+        "rate_limits": rate_limit_stats(),
+        "jwt_cache": token_cache_stats(),
+        "avatar_variants": variant_cache_stats(),
+        "token_revocation": revocation_stats(),
+        "mail_outbox": {**mail_worker.stats(), **await queue_status(db)},
+    }
+    if database.replica_engine is not None:
+        result["db_replica_pool"] = database.pool_status(database.replica_engine, database.replica_pool_stats)
+    return result
@@ -1,49 +1,112 @@
+import math
+import time
+import uuid
 from datetime import datetime, timedelta, timezone
 from typing import Optional
 
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Request, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordRequestForm
-from jose import jwt, JWTError
 from passlib.context import CryptContext
-from sqlalchemy.orm import Session
-from fastapi_mail import FastMail, MessageSchema, ConnectionConfig
+from sqlalchemy import inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import make_transient_to_detached
 
 from app.database import get_db
 from app import models, schemas
-from app.models import User
+from app.models import User, RoleEnum
 from app.config import settings
-from app.cache import get_user_from_cache, cache_user
-
-router = APIRouter(prefix="/auth", tags=["auth"])
+from app.cache import get_user_from_cache, cache_user, drop_user_cache, user_cache_generation
+from app.hashing import PasswordHasher, PasswordHasherBusy
+from app.outbox import enqueue
+from app.ratelimit import login_username, rate_limit
+from app.revocation import is_revoked, revoke_token, revoke_user_tokens
+from app.tokens import TokenError, decode_token, encode_token
+
+router = APIRouter(
+    prefix="/auth",
+    tags=["auth"],
+    dependencies=[Depends(rate_limit("auth", 60, 60))],
+)
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+hasher = PasswordHasher(
+    pwd_context,
+    workers=settings.PASSWORD_HASH_WORKERS,
+    max_pending=settings.PASSWORD_HASH_MAX_PENDING,
+)
+
+busy_exc = HTTPException(
+    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+    detail="Server is busy, try again later",
+    headers={"Retry-After": "1"},
+)
 
 
 def verify_password(plain: str, hashed: str) -> bool:
     """
     Перевіряє, чи відповідає пароль хешованому паролю.
 
+    bcrypt виконується в обмеженому пулі ``hasher``.
+
     :param plain: Пароль у відкритому вигляді.
     :param hashed: Хешований пароль з бази даних.
     :return: True, якщо паролі збігаються.
+    :raises HTTPException: 503 — якщо черга хешування переповнена.
     """
-    return pwd_context.verify(plain, hashed)
+    try:
+        return hasher.verify(plain, hashed)
+    except PasswordHasherBusy:
+        raise busy_exc
 
 
 def hash_password(plain: str) -> str:
     """
     Хешує plain password для збереження в БД.
 
+    bcrypt виконується в обмеженому пулі ``hasher``.
+
     :param plain: Пароль у відкритому вигляді.
     :return: Хешований пароль.
+    :raises HTTPException: 503 — якщо черга хешування переповнена.
     """
-    return pwd_context.hash(plain)
+    try:
+        return hasher.hash(plain)
+    except PasswordHasherBusy:
+        raise busy_exc
+
+
+async def verify_password_async(plain: str, hashed: str) -> bool:
+    """
+    Асинхронний варіант ``verify_password`` для async-маршрутів.
+
+    :raises HTTPException: 503 — якщо черга хешування переповнена.
+    """
+    try:
+        return await hasher.verify_async(plain, hashed)
+    except PasswordHasherBusy:
+        raise busy_exc
+
+
+async def hash_password_async(plain: str) -> str:
+    """
+    Асинхронний варіант ``hash_password`` для async-маршрутів.
+
+    :raises HTTPException: 503 — якщо черга хешування переповнена.
+    """
+    try:
+        return await hasher.hash_async(plain)
+    except PasswordHasherBusy:
+        raise busy_exc
 
 
 def create_access_token(data: dict, expires_minutes: Optional[int] = None) -> str:
     """
     Створює JWT access token для користувача.
 
+    Токен отримує унікальний ``jti`` і ``iat`` з точністю до мілісекунди,
+    щоб його можна було відкликати окремо або разом з усіма токенами
+    користувача.
+
     :param data: Дані для токена. Має містити ключ "sub".
     :param expires_minutes: Час дії токена в хвилнах.
     :return: JWT токен.
@@ -52,21 +115,9 @@ def create_access_token(data: dict, expires_minutes: Optional[int] = None) -> st
     expire = datetime.now(timezone.utc) + timedelta(
         minutes=expires_minutes or settings.ACCESS_TOKEN_EXPIRE_MINUTES
     )
-    to_encode.update({"exp": expire})
-    return jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
-
-
-conf = ConnectionConfig(
-    MAIL_USERNAME=settings.SMTP_USER,
-    MAIL_PASSWORD=settings.SMTP_PASSWORD,
-    MAIL_FROM=settings.SMTP_FROM,
-    MAIL_SERVER=settings.SMTP_HOST,
-    MAIL_PORT=settings.SMTP_PORT,
-    MAIL_STARTTLS=False,
-    MAIL_SSL_TLS=False,
-    USE_CREDENTIALS=False,
-    VALIDATE_CERTS=False,
-)
+    # floor: токен, виданий до відкликання, не повинен отримати пізніший iat
+    to_encode.update({"exp": expire, "iat": math.floor(time.time() * 1000) / 1000, "jti": uuid.uuid4().hex})
+    return encode_token(to_encode)
 
 
 def get_token_from_header(request: Request) -> str:
@@ -90,76 +141,137 @@ def _serialize_user(u: User) -> dict:
         "role": u.role.value if hasattr(u.role, "value") else str(u.role),
         "is_verified": u.is_verified,
         "avatar_url": u.avatar_url,
+        "avatar_hash": u.avatar_hash,
     }
 
 
+def _user_from_cache(data: dict) -> User:
+    """
+    Відновлює відокремлений (transient) об'єкт User із кешованого payload.
+
+    Об'єкт не прив'язаний до сесії: маршрути, що змінюють користувача,
+    мають завантажити його з БД за ``id``.
+    """
+    return User(
+        id=data["id"],
+        email=data["email"],
+        role=RoleEnum(data["role"]),
+        is_verified=data["is_verified"],
+        avatar_url=data["avatar_url"],
+        avatar_hash=data.get("avatar_hash"),
+    )
+
+
 async def get_current_user(
+    request: Request,
     token: str = Depends(get_token_from_header),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ) -> User:
     """
     Отримує поточного авторизованого користувача.
 
+    Спершу шукає користувача в Redis-кеші і лише при промаху звертається
+    до БД, після чого кладе результат у кеш. Знайдений principal зберігається в ``request.state.user`` і
+    повторно використовується до кінця запиту.
+
     :param token: JWTтокен з заголовка Authorization.
     :param db: Сесія SQLAlchemy.
     :return: Обєкт користувача.
-    :raises HTTPException: Якщо токен недійсний .
+    :raises HTTPException: Якщо токен недійсний або відкликаний.
     """
+    principal = getattr(request.state, "user", None)
+    if principal is not None:
+        return principal
+
     try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+        payload = decode_token(token)
         user_id: int = int(payload.get("sub"))
         if not user_id:
             raise cred_exc
-    except JWTError:
+    except TokenError:
         raise cred_exc
+    if await is_revoked(payload):
+        raise cred_exc
+
+    cached = await get_user_from_cache(user_id)
+    if cached:
+        request.state.user = _user_from_cache(cached)
+        return request.state.user
 
-    user = db.query(User).get(user_id)
+    # знімок покоління до читання: якщо кеш скинуть, поки йде SELECT, запис не відбудеться
+    generation = await user_cache_generation(user_id)
+    user = await db.get(User, user_id)
     if not user:
         raise cred_exc
 
+    await cache_user(user.id, _serialize_user(user), generation)
+    request.state.user = user
+    return user
+
+
+async def attach_principal(db: AsyncSession, user: User) -> User:
+    """
+    Прив'язує principal до сесії запиту без повторного SELECT.
+
+    Користувач з кешу — транзиєнтний об'єкт з відомим id, тож він
+    переводиться в detached-стан і додається до сесії; подальший коміт
+    оновить лише змінені колонки.
+
+    :param db: Сесія SQLAlchemy.
+    :param user: Поточний користувач.
+    :return: Об'єкт користувача, прив'язаний до ``db``.
+    """
+    state = inspect(user)
+    if state.session_id == db.sync_session.hash_key:
+        return user
+    if state.persistent:
+        return await db.merge(user, load=False)
+    if state.transient:
+        make_transient_to_detached(user)
+    db.add(user)
     return user
 
 
 @router.post("/signup", response_model=schemas.UserOut, status_code=status.HTTP_201_CREATED)
-def signup(user_in: schemas.UserCreate, bg: BackgroundTasks, db: Session = Depends(get_db)):
+async def signup(user_in: schemas.UserCreate, db: AsyncSession = Depends(get_db)):
     """
-    Реєструє нового користувача та надсилає лист з підтвердженням email.
+    Реєструє нового користувача та ставить у чергу лист з підтвердженням email.
+
+    Лист потрапляє в ``mail_outbox`` у тій самій транзакції, що й користувач.
 
     :param user_in: Дані нового користувача (email, password).
-    :param bg: Об'єкт BackgroundTasks для асинхронного надсилання листа.
     :param db: Сесія бази даних SQLAlchemy.
     :return: Об'єкт користувача у відповіді.
     :raises HTTPException: 409 — якщо користувач уже існує.
     """
-    if db.query(models.User).filter(models.User.email == user_in.email).first():
+    if await db.scalar(select(models.User).where(models.User.email == user_in.email)):
         raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="User already exists")
 
     user = models.User(
         email=user_in.email,
-        password_hash=hash_password(user_in.password),
+        password_hash=await hash_password_async(user_in.password),
         is_verified=False,
     )
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    await db.flush()
 
     token = create_access_token({"sub": str(user.id)})
-    msg = MessageSchema(
-        subject="Verify your email",
-        recipients=[user.email],
-        body=f"Your verification token: {token}",
-        subtype="plain",
-    )
-
-    async def _send():
-        await FastMail(conf).send_message(msg)
-
-    bg.add_task(_send)
+    enqueue(db, user.email, "Verify your email", f"Your verification token: {token}")
+    await db.commit()
+    await db.refresh(user)
     return user
 
 
-@router.post("/login", response_model=schemas.Token)
-def login(form: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+# bcrypt дорогий: ліміт на IP і окремо на обліковий запис, до перевірки пароля
+@router.post(
+    "/login",
+    response_model=schemas.Token,
+    dependencies=[
+        Depends(rate_limit("auth.login", 20, 60)),
+        Depends(rate_limit("auth.login.account", 10, 60, key=login_username)),
+    ],
+)
+async def login(form: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)):
     """
     Авторизує користувача за email та паролем.
 
@@ -168,8 +280,8 @@ def login(form: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get
     :return: JWT токен.
     :raises HTTPException: Якщо авторизація не вдалася або email не підтверджено.
     """
-    user = db.query(models.User).filter(models.User.email == form.username).first()
-    if not user or not verify_password(form.password, user.password_hash):
+    user = await db.scalar(select(models.User).where(models.User.email == form.username))
+    if not user or not await verify_password_async(form.password, user.password_hash):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
     if not user.is_verified:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Email is not verified")
@@ -179,7 +291,7 @@ def login(form: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get
 
 
 @router.get("/verify", response_model=str)
-def verify_email(token: str, db: Session = Depends(get_db)):
+async def verify_email(token: str, db: AsyncSession = Depends(get_db)):
     """
     Верифікує користувача через токен з email.
 
@@ -189,69 +301,86 @@ def verify_email(token: str, db: Session = Depends(get_db)):
     :raises HTTPException: Якщо токен або користувач недійсні.
     """
     try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+        payload = decode_token(token)
         sub = payload.get("sub")
         if not sub:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid token")
         user_id = int(sub)
-    except JWTError:
+    except TokenError:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid token")
 
-    user = db.get(models.User, user_id)
+    user = await db.get(models.User, user_id)
     if not user:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid token")
 
     user.is_verified = True
-    db.commit()
+    await db.commit()
+    await drop_user_cache(user.id)
     return "verified"
 
 
 @router.post("/reset/request")
-def reset_request(body: schemas.ResetRequest, db: Session = Depends(get_db)):
+async def reset_request(body: schemas.ResetRequest, db: AsyncSession = Depends(get_db)):
     """
-    Генерує токен для скидання пароля та друкує його в консоль.
+    Генерує токен для скидання пароля та ставить у чергу лист з ним.
 
     :param body: Об'єкт з email користувача.
     :param db: Сесія БД.
     :return: JSON: {"ok": True}
     """
-    user = db.query(User).filter_by(email=body.email).first()
+    user = await db.scalar(select(User).where(User.email == body.email))
     if not user:
         return {"ok": True}
 
-    payload = {
-        "sub": str(user.id),
-        "purpose": "pwd_reset",
-        "exp": datetime.utcnow() + timedelta(minutes=30)
-    }
-
-    token = jwt.encode(payload, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
-
-    print(f"[DEV] Reset token for {user.email}:\n{token}")
+    token = create_access_token({"sub": str(user.id), "purpose": "pwd_reset"}, expires_minutes=30)
+    enqueue(db, user.email, "Password reset", f"Your password reset token: {token}")
+    await db.commit()
     return {"ok": True, "token": token}
 
 
 @router.post("/reset/confirm")
-def reset_confirm(body: schemas.ResetConfirm, db: Session = Depends(get_db)):
+async def reset_confirm(body: schemas.ResetConfirm, db: AsyncSession = Depends(get_db)):
     """
     Приймає токен скидання пароля та новий пароль, оновлює в БД.
 
+    Усі токени користувача, видані раніше (зокрема і цей), відкликаються.
+
     :param body: Об'єкт із токеном та новим паролем.
     :param db: Сесія БД.
     :return: JSON: {"ok": True}
     :raises HTTPException: Якщо токен невалідний або користувача не знайдено.
     """
     try:
-        data = jwt.decode(body.token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+        data = decode_token(body.token)
         if data.get("purpose") != "pwd_reset":
             raise ValueError("Invalid purpose")
+        if await is_revoked(data):
+            raise ValueError("Token revoked")
 
-        user = db.query(User).get(int(data["sub"]))
+        user = await db.get(User, int(data["sub"]))
         if not user:
             raise ValueError("User not found")
 
-        user.password_hash = hash_password(body.new_password)
-        db.commit()
+        user.password_hash = await hash_password_async(body.new_password)
+        await revoke_user_tokens(user.id)
+        await db.commit()
+        await drop_user_cache(user.id)
         return {"ok": True}
+    except HTTPException:
+        raise
     except Exception:
         raise HTTPException(status_code=400, detail="Invalid or expired token")
+
+
+@router.post("/logout")
+async def logout(token: str = Depends(get_token_from_header), current: User = Depends(get_current_user)):
+    """
+    Відкликає поточний access token.
+
+    :param token: JWT токен з заголовка Authorization.
+    :param current: Поточний користувач (перевіряє, що токен дійсний).
+    :return: JSON: {"ok": True}
+    :raises HTTPException: 401 — токен недійсний; 503 — відкликання неможливо записати.
+    """
+    await revoke_token(decode_token(token))
+    return {"ok": True}
@@ -0,0 +1,235 @@
+"""
+Прийом і обробка аватарів.
+
+Тіло ``multipart/form-data`` читається потоково, без попереднього розбору
+FastAPI: частина ``file`` накопичується в пам'яті не більше ніж до
+``AVATAR_MAX_BYTES``, тип визначається за сигнатурою перших байтів, і запит
+переривається (413/415), щойно ліміт перевищено або сигнатура не збіглася —
+решта тіла не читається.
+
+Аватари адресуються sha256 вихідних байтів: для кожного нового зображення
+локально (Pillow, якщо встановлено) готуються розміри ``AVATAR_VARIANT_SIZES``
+і вивантажуються один раз, а запис ``avatar_blobs`` зберігає їхні URL.
+Повторне завантаження того самого зображення будь-яким користувачем лише
+перепризначає ``User.avatar_url``. Записи незмінні, тож URL розмірів
+кешуються в процесі.
+"""
+import hashlib
+from io import BytesIO
+from typing import Dict, Optional, Tuple
+
+import multipart
+from fastapi import HTTPException, Request, status
+from multipart.multipart import parse_options_header
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import crud, storage
+from app.cache import LocalLRU
+from app.config import settings
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # без Pillow аватар зберігається як є
+    Image = None
+
+_variants = LocalLRU(settings.AVATAR_VARIANT_CACHE_SIZE, settings.AVATAR_VARIANT_CACHE_TTL)
+
+FIELD_NAME = "file"
+SNIFF_BYTES = 12
+# заголовки частин і межі multipart поверх самого файлу
+MULTIPART_OVERHEAD = 16 * 1024
+
+SIGNATURES = (
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+)
+
+# OpenAPI-опис тіла, бо маршрут читає його сам
+UPLOAD_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "required": [FIELD_NAME],
+                    "properties": {FIELD_NAME: {"type": "string", "format": "binary"}},
+                }
+            }
+        },
+    }
+}
+
+too_large_exc = HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="Avatar is too large")
+unsupported_exc = HTTPException(
+    status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+    detail="Avatar must be a PNG, JPEG, GIF or WebP image",
+)
+
+
+def sniff(head: bytes) -> Optional[str]:
+    """Визначає тип зображення за сигнатурою; ``Content-Type`` клієнта не враховується."""
+    for signature, content_type in SIGNATURES:
+        if head.startswith(signature):
+            return content_type
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+
+class _AvatarPart:
+    """Колбеки ``multipart.MultipartParser``: збирає лише частину ``file``."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.data = bytearray()
+        self.content_type: Optional[str] = None
+        self.found = False
+        self._capturing = False
+        self._field = b""
+        self._value = b""
+        self._headers = {}
+
+    def on_part_begin(self):
+        self._headers = {}
+
+    def on_header_field(self, data: bytes, start: int, end: int):
+        self._field += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int):
+        self._value += data[start:end]
+
+    def on_header_end(self):
+        self._headers[self._field.lower()] = self._value
+        self._field = self._value = b""
+
+    def on_headers_finished(self):
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        self._capturing = options.get(b"name") == FIELD_NAME.encode() and not self.found
+        self.found = self.found or self._capturing
+
+    def on_part_data(self, data: bytes, start: int, end: int):
+        if not self._capturing:
+            return
+        self.data += data[start:end]
+        if len(self.data) > self.limit:
+            raise too_large_exc
+        if self.content_type is None and len(self.data) >= SNIFF_BYTES:
+            self.content_type = sniff(bytes(self.data[:SNIFF_BYTES]))
+            if self.content_type is None:
+                raise unsupported_exc
+
+    def on_part_end(self):
+        if self._capturing and self.content_type is None:
+            self.content_type = sniff(bytes(self.data[:SNIFF_BYTES]))
+            if self.content_type is None:
+                raise unsupported_exc
+        self._capturing = False
+
+
+async def read_avatar(request: Request) -> Tuple[bytes, str]:
+    """
+    Потоково читає аватар з ``multipart/form-data``.
+
+    :param request: Запит з полем ``file``.
+    :return: Байти зображення і визначений за сигнатурою MIME-тип.
+    :raises HTTPException: 413 — файл більший за ``AVATAR_MAX_BYTES``;
+        415 — не зображення; 422 — тіло не multipart або без поля ``file``.
+    """
+    limit = settings.AVATAR_MAX_BYTES
+    length = request.headers.get("content-length")
+    if length and length.isdigit() and int(length) > limit + MULTIPART_OVERHEAD:
+        raise too_large_exc
+
+    content_type, options = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in options:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Expected multipart/form-data")
+
+    part = _AvatarPart(limit)
+    parser = multipart.MultipartParser(options[b"boundary"], {
+        name: getattr(part, name)
+        for name in (
+            "on_part_begin", "on_part_data", "on_part_end", "on_header_field",
+            "on_header_value", "on_header_end", "on_headers_finished",
+        )
+    })
+    received = 0
+    async for chunk in request.stream():
+        received += len(chunk)
+        if received > limit + MULTIPART_OVERHEAD:
+            raise too_large_exc
+        parser.write(chunk)
+    parser.finalize()
+
+    if not part.found or not part.data:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Field 'file' is required")
+    return bytes(part.data), part.content_type
+
+
+def resize(data: bytes, content_type: str, size: int) -> Tuple[bytes, str]:
+    """
+    Зменшує зображення до ``size`` по більшій стороні (блокуюче, CPU).
+
+    PNG/GIF з прозорістю зберігаються як PNG, решта — як JPEG. Без Pillow
+    повертає вхідні дані без змін.
+
+    :raises HTTPException: 415 — зображення пошкоджене або завелике в пікселях.
+    """
+    if Image is None:
+        return data, content_type
+    try:
+        with Image.open(BytesIO(data)) as image:
+            if image.width * image.height > settings.AVATAR_MAX_PIXELS:
+                raise unsupported_exc
+            image = ImageOps.exif_transpose(image)
+            image.thumbnail((size, size))
+            out = BytesIO()
+            if image.mode in ("RGBA", "LA", "P"):
+                image.save(out, format="PNG", optimize=True)
+                return out.getvalue(), "image/png"
+            image.convert("RGB").save(out, format="JPEG", quality=settings.AVATAR_JPEG_QUALITY, optimize=True)
+            return out.getvalue(), "image/jpeg"
+    except (OSError, ValueError, Image.DecompressionBombError):
+        raise unsupported_exc
+
+
+def digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def store_variants(key: str, data: bytes, content_type: str) -> Tuple[str, Dict[str, str]]:
+    """
+    Готує всі розміри аватара і зберігає їх під ``<key>/<size>`` (блокуюче).
+
+    :return: MIME-тип розмірів і словник ``{"<size>": url}``.
+    """
+    variants = {}
+    resized_type = content_type
+    for size in settings.AVATAR_VARIANT_SIZES:
+        resized, resized_type = resize(data, content_type, size)
+        variants[str(size)] = storage.backend.save(f"{key}/{size}", resized, resized_type)
+    return resized_type, variants
+
+
+async def get_variants(db: AsyncSession, key: str) -> Optional[Dict[str, str]]:
+    """URL розмірів уже збереженого аватара або None, якщо такого вмісту ще немає."""
+    variants = _variants.get(key)
+    if variants is None:
+        blob = await crud.get_avatar_blob(db, key)
+        if blob is None:
+            return None
+        variants = blob.variants
+        _variants.set(key, variants)
+    return variants
+
+
+def pick(variants: Dict[str, str], size: int) -> str:
+    """URL найменшого розміру, не меншого за ``size`` (або найбільшого наявного)."""
+    sizes = sorted(int(s) for s in variants)
+    return variants[str(next((s for s in sizes if s >= size), sizes[-1]))]
+
+
+def variant_cache_stats() -> dict:
+    return _variants.stats()
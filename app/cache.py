@@ -1,29 +1,285 @@
+import asyncio
 import json
-from typing import Optional
+import time
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
 from redis.asyncio import Redis
+from redis.exceptions import RedisError, WatchError
 from app.config import settings
 
 _redis: Optional[Redis] = None
+_redis_loop: Optional[asyncio.AbstractEventLoop] = None
 USER_CACHE_TTL = 900  
+USER_CACHE_CHANNEL = "user-cache:invalidate"
+USER_GENERATION_PREFIX = "user-gen:"
+PRIMARY_STICKY_PREFIX = "db:primary:"
+CONTACTS_VERSION_PREFIX = "contacts:version:"
+
+
+class LocalLRU:
+    """
+    Обмежений за розміром in-process LRU-кеш з TTL для записів.
+
+    Не потокобезпечний: використовується лише з event loop.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Any, tuple[float, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expired = 0
+
+    def get(self, key) -> Optional[Any]:
+        item = self._data.get(key)
+        if item is None:
+            self.misses += 1
+            return None
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            del self._data[key]
+            self.expired += 1
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key, value, ttl: Optional[float] = None) -> None:
+        self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def pop(self, key) -> None:
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expired": self.expired,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+_local_users = LocalLRU(settings.USER_CACHE_L1_SIZE, settings.USER_CACHE_L1_TTL)
+_sticky_users = LocalLRU(10000, settings.DB_REPLICA_STICKY_SECONDS)
+_redis_hits = 0
+_redis_misses = 0
+# лічильник скидань локального кешу: запис у L1 після скидання відкидається
+_local_epoch = 0
+_stale_writes = 0
+
 
 async def get_redis() -> Redis:
-    global _redis
-    if _redis is None:
+    # redis.asyncio connections are bound to the loop that opened them
+    global _redis, _redis_loop
+    loop = asyncio.get_running_loop()
+    if _redis is None or _redis_loop is not loop:
         _redis = Redis.from_url(settings.REDIS_URL, decode_responses=True)
+        _redis_loop = loop
     return _redis
 
 def _user_key(user_id: int) -> str:
     return f"user:{user_id}"
 
-async def cache_user(user_id: int, payload: dict) -> None:
-    r = await get_redis()
-    await r.set(_user_key(user_id), json.dumps(payload), ex=USER_CACHE_TTL)
+def _generation_key(user_id: int) -> str:
+    return f"{USER_GENERATION_PREFIX}{user_id}"
+
+async def user_cache_generation(user_id: int) -> Tuple[int, Optional[str]]:
+    """
+    Знімок поколінь кешу користувача; береться до читання з БД.
+
+    :return: Локальна епоха і покоління в Redis (``None``, якщо Redis недоступний).
+    """
+    try:
+        r = await get_redis()
+        generation = await r.get(_generation_key(user_id)) or "0"
+    except (RedisError, OSError):
+        generation = None
+    return _local_epoch, generation
+
+async def cache_user(user_id: int, payload: dict, generation: Optional[Tuple[int, Optional[str]]] = None) -> None:
+    """
+    Кладе користувача в кеш.
+
+    З ``generation`` запис виконується лише якщо кеш користувача не скидали
+    після знімка (WATCH/MULTI на лічильнику покоління), інакше застарілі дані,
+    прочитані до зміни ролі чи пароля, повернулися б у кеш на ``USER_CACHE_TTL``.
+
+    :param generation: Результат :func:`user_cache_generation` до читання з БД.
+    """
+    global _stale_writes
+    if generation is None:
+        _local_users.set(user_id, payload)
+        try:
+            r = await get_redis()
+            await r.set(_user_key(user_id), json.dumps(payload), ex=USER_CACHE_TTL)
+        except (RedisError, OSError):
+            pass
+        return
+
+    epoch, expected = generation
+    if expected is not None:
+        try:
+            r = await get_redis()
+            async with r.pipeline(transaction=True) as pipe:
+                await pipe.watch(_generation_key(user_id))
+                if (await pipe.get(_generation_key(user_id)) or "0") != expected:
+                    _stale_writes += 1
+                    return
+                pipe.multi()
+                pipe.set(_user_key(user_id), json.dumps(payload), ex=USER_CACHE_TTL)
+                await pipe.execute()
+        except WatchError:
+            _stale_writes += 1
+            return
+        except (RedisError, OSError):
+            pass
+    if epoch != _local_epoch:
+        _stale_writes += 1
+        return
+    _local_users.set(user_id, payload)
 
 async def get_user_from_cache(user_id: int) -> Optional[dict]:
-    r = await get_redis()
-    raw = await r.get(_user_key(user_id))
-    return json.loads(raw) if raw else None
+    global _redis_hits, _redis_misses
+    payload = _local_users.get(user_id)
+    if payload is not None:
+        return payload
+    epoch = _local_epoch
+    try:
+        r = await get_redis()
+        raw = await r.get(_user_key(user_id))
+    except (RedisError, OSError):
+        return None
+    if not raw:
+        _redis_misses += 1
+        return None
+    _redis_hits += 1
+    payload = json.loads(raw)
+    if epoch == _local_epoch:
+        _local_users.set(user_id, payload)
+    return payload
+
+def _drop_local(user_id: Optional[int] = None) -> None:
+    global _local_epoch
+    _local_epoch += 1
+    if user_id is None:
+        _local_users.clear()
+    else:
+        _local_users.pop(user_id)
 
 async def drop_user_cache(user_id: int) -> None:
-    r = await get_redis()
-    await r.delete(_user_key(user_id))
+    _drop_local(user_id)
+    try:
+        r = await get_redis()
+        # спершу покоління: незавершені промахи кешу вже не зможуть записати старі дані
+        await r.incr(_generation_key(user_id))
+        await r.delete(_user_key(user_id))
+        await r.publish(USER_CACHE_CHANNEL, str(user_id))
+    except (RedisError, OSError):
+        pass
+
+
+async def listen_for_invalidations() -> None:
+    """
+    Слухає канал інвалідації в Redis і видаляє записи з локального кешу.
+
+    Після кожного (пере)підключення локальний кеш очищується, бо
+    повідомлення, надіслані під час розриву, втрачено.
+    """
+    while True:
+        try:
+            r = await get_redis()
+            pubsub = r.pubsub()
+            await pubsub.subscribe(USER_CACHE_CHANNEL)
+            _drop_local()
+            try:
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        _drop_local(int(message["data"]))
+            finally:
+                await pubsub.reset()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            await asyncio.sleep(1)
+
+
+async def mark_primary_sticky(user_id: int) -> None:
+    """
+    Прив'язує читання користувача до основної БД на ``DB_REPLICA_STICKY_SECONDS``.
+
+    Викликається після коміту запису, щоб наступні читання бачили власні зміни
+    (read-your-writes) попри затримку реплікації.
+    """
+    _sticky_users.set(user_id, True)
+    try:
+        r = await get_redis()
+        await r.set(
+            f"{PRIMARY_STICKY_PREFIX}{user_id}",
+            "1",
+            px=int(settings.DB_REPLICA_STICKY_SECONDS * 1000),
+        )
+    except (RedisError, OSError):
+        pass
+
+
+async def is_primary_sticky(user_id: int) -> bool:
+    if _sticky_users.get(user_id):
+        return True
+    try:
+        r = await get_redis()
+        return bool(await r.exists(f"{PRIMARY_STICKY_PREFIX}{user_id}"))
+    except (RedisError, OSError):
+        # без Redis не можемо знати про записи з інших воркерів — читаємо з основної
+        return True
+
+
+async def get_contacts_version(owner_id: int) -> Optional[int]:
+    """
+    Повертає лічильник версії контактів власника.
+
+    Відсутній ключ ініціалізується поточним часом у наносекундах, а не нулем,
+    щоб після втрати даних Redis версії не повторювали вже видані ETag.
+
+    :return: Номер версії або ``None``, якщо Redis недоступний.
+    """
+    key = f"{CONTACTS_VERSION_PREFIX}{owner_id}"
+    try:
+        r = await get_redis()
+        version = await r.get(key)
+        if version is None:
+            await r.set(key, time.time_ns(), nx=True)
+            version = await r.get(key)
+    except (RedisError, OSError):
+        return None
+    return int(version) if version is not None else None
+
+
+async def bump_contacts_version(owner_id: int) -> None:
+    try:
+        r = await get_redis()
+        await r.incr(f"{CONTACTS_VERSION_PREFIX}{owner_id}")
+    except (RedisError, OSError):
+        pass
+
+
+def user_cache_stats() -> dict:
+    return {
+        "local": _local_users.stats(),
+        "redis": {"hits": _redis_hits, "misses": _redis_misses},
+        "stale_writes_skipped": _stale_writes,
+    }
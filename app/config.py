@@ -1,14 +1,50 @@
+from typing import Dict, List
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 class Settings(BaseSettings):
     # Core
     DATABASE_URL: str = "postgresql+psycopg://postgres:postgres@db:5432/contacts_db_hw12"
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30.0
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    DATABASE_REPLICA_URL: str = ""
+    DB_REPLICA_STICKY_SECONDS: float = 5.0
+    DB_PROFILE: bool = False
+    DB_PROFILE_MAX_STATEMENTS: int = 20
+    DB_PROFILE_REPEAT_THRESHOLD: int = 5
+    DB_SLOW_QUERY_MS: float = 200.0
+    DB_EXPLAIN_SLOW: bool = True
+    # має з запасом перевищувати найдовшу транзакцію запису контактів
+    CONTACT_CHANGES_SETTLE_SECONDS: float = 30.0
     SECRET_KEY: str = "dev"
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    JWT_BACKEND: str = "jose"  # jose | hmac
+    JWT_CACHE_SIZE: int = 10_000
+    JWT_CACHE_MAX_TTL: float = 300.0
+    TOKEN_REVOCATION_TTL: int = 86_400  # не менше за найдовший строк дії токена
+    TOKEN_REVOCATION_SYNC_INTERVAL: float = 5.0
+    TOKEN_REVOCATION_BLOOM_CAPACITY: int = 100_000
+    TOKEN_REVOCATION_BLOOM_ERROR_RATE: float = 0.001
+    PASSWORD_HASH_WORKERS: int = 4
+    PASSWORD_HASH_MAX_PENDING: int = 32
 
     # Cache
     REDIS_URL: str = "redis://redis:6379/0"
+    USER_CACHE_L1_SIZE: int = 1024
+    USER_CACHE_L1_TTL: float = 30.0
+
+    # Rate limiting
+    RATE_LIMIT_SYNC_INTERVAL: float = 1.0
+    RATE_LIMIT_FAIL_OPEN: bool = True
+    RATE_LIMIT_MAX_KEYS: int = 100_000
+    RATE_LIMITS: Dict[str, str] = {}  # {"auth.login": "5/60"}
+
+    # Metrics
+    METRICS_TOKEN: str = ""
 
     # SMTP (dev → MailHog)
     SMTP_HOST: str = "mailhog"
@@ -16,10 +52,30 @@ class Settings(BaseSettings):
     SMTP_USER: str = ""
     SMTP_PASSWORD: str = ""
     SMTP_FROM: str = "no-reply@example.com"
+    MAIL_SMTP_CONNECTIONS: int = 2
+    MAIL_OUTBOX_BATCH_SIZE: int = 50
+    MAIL_OUTBOX_POLL_INTERVAL: float = 1.0
+    MAIL_OUTBOX_LEASE_SECONDS: float = 120.0
+    MAIL_RETRY_BASE_SECONDS: float = 10.0
+    MAIL_RETRY_MAX_SECONDS: float = 3600.0
+    MAIL_MAX_ATTEMPTS: int = 8
+    MAIL_OUTBOX_IN_PROCESS: bool = False  # воркер у процесі API замість окремого сервісу
 
     # Cloudinary
     CLOUDINARY_URL: str = ""
 
+    # Avatars
+    AVATAR_STORAGE: str = "cloudinary"  # cloudinary | local
+    AVATAR_LOCAL_DIR: str = "media"
+    AVATAR_LOCAL_URL: str = "/media"
+    AVATAR_MAX_BYTES: int = 5 * 1024 * 1024
+    AVATAR_MAX_PIXELS: int = 40_000_000
+    AVATAR_SIZE: int = 256  # розмір для avatar_url; має бути серед AVATAR_VARIANT_SIZES
+    AVATAR_VARIANT_SIZES: List[int] = [256, 128, 64]
+    AVATAR_VARIANT_CACHE_SIZE: int = 10_000
+    AVATAR_VARIANT_CACHE_TTL: float = 3600.0
+    AVATAR_JPEG_QUALITY: int = 85
+
     model_config = SettingsConfigDict(env_file=".env", extra="ignore")
 
 settings = Settings()
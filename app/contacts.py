@@ -1,16 +1,51 @@
-from datetime import date, timedelta
-from typing import List, Optional, Dict, Any
-
-from fastapi import APIRouter, Depends, HTTPException, Query, status
-from sqlalchemy.orm import Session
-from sqlalchemy import or_, and_
+import base64
+import binascii
+import codecs
+import csv
+import hashlib
+import io
+import json
+from collections import deque
+from datetime import date, datetime, timedelta, timezone
+from typing import AsyncIterator, List, Literal, Optional, Dict, Any, Tuple
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import or_, select, insert, update
 from sqlalchemy.exc import IntegrityError
 
+from app.config import settings
 from app.database import get_db
-from app import models, schemas
+from app import crud, models, schemas
 from app.auth import get_current_user
-
-router = APIRouter(prefix="/contacts", tags=["default"])
+from app.cache import bump_contacts_version, get_contacts_version
+from app.deps import get_read_db, user_rate_key
+from app.ratelimit import rate_limit
+
+router = APIRouter(
+    prefix="/contacts",
+    tags=["default"],
+    dependencies=[Depends(rate_limit("contacts", 600, 60, key=user_rate_key))],
+)
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+EXPORT_BATCH_SIZE = 1000
+EXPORT_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+BULK_BATCH_SIZE = 500
+BULK_MAX_ROWS = 10000
+CACHE_CONTROL = "private, no-cache"
+# зміни, свіжіші за це вікно, ще можуть комітитися з меншим updated_at — віддаємо їх наступного разу
+CHANGES_SETTLE = timedelta(seconds=settings.CONTACT_CHANGES_SETTLE_SECONDS)
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+CONFLICT_DETAILS = {
+    "uq_contacts_email": "Contact with this email already exists",
+    "uq_contacts_name": "Contact with this name already exists",
+}
 
 
 def _field_names():
@@ -33,6 +68,9 @@ def _to_model_kwargs(payload: Dict[str, Any]) -> Dict[str, Any]:
     for k in ("last_name", "email", "birthday", "extra"):
         if k in payload:
             out[k] = payload[k]
+    if "birthday" in out:
+        # Core INSERT/UPDATE оминає @validates, тож ключ рахуємо тут
+        out["birthday_md"] = models.birthday_key(out["birthday"])
     return out
 
 
@@ -41,13 +79,13 @@ def _ensure_owner(obj_owner_id: int, user_id: int):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not found")
 
 
-def _to_search_filter(db: Session, user_id: int, search: Optional[str]):
-    q = db.query(models.Contact).filter(models.Contact.owner_id == user_id)
+def _to_search_filter(user_id: int, search: Optional[str]):
+    q = select(models.Contact).where(models.Contact.owner_id == user_id, crud.LIVE)
     if search:
         like = f"%{search.lower()}%"
         first_field, _ = _field_names()
         first_col = getattr(models.Contact, first_field)
-        q = q.filter(
+        q = q.where(
             or_(
                 first_col.ilike(like),
                 models.Contact.last_name.ilike(like),
@@ -57,138 +95,598 @@ def _to_search_filter(db: Session, user_id: int, search: Optional[str]):
     return q
 
 
-def _check_duplicates_global(db: Session, kwargs: Dict[str, Any]):
-    email = kwargs.get("email")
-    if email:
-        exists_email = db.query(models.Contact).filter(models.Contact.email == email).first()
-        if exists_email:
-            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Contact with this email already exists")
+def _encode_cursor(**values: int) -> str:
+    raw = json.dumps(values).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str, *keys: str) -> Tuple[int, ...]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded))
+        return tuple(int(data[k]) for k in keys)
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+
+def _encode_watermark(contact: models.Contact) -> str:
+    updated_at = contact.updated_at
+    if updated_at.tzinfo is None:
+        updated_at = updated_at.replace(tzinfo=timezone.utc)
+    return _encode_cursor(ts=(updated_at - EPOCH) // timedelta(microseconds=1), id=contact.id)
+
+
+def _decode_watermark(token: str) -> Tuple[datetime, int]:
+    ts, last_id = _decode_cursor(token, "ts", "id")
+    return EPOCH + timedelta(microseconds=ts), last_id
+
+
+async def _contacts_etag(owner_id: int, *parts: Any) -> Optional[str]:
+    version = await get_contacts_version(owner_id)
+    if version is None:
+        return None
+    digest = hashlib.blake2b(repr(parts).encode(), digest_size=8).hexdigest()
+    return f'"{owner_id}-{version}-{digest}"'
+
+
+def _not_modified(request: Request, etag: Optional[str]) -> bool:
+    header = request.headers.get("if-none-match")
+    if etag is None or not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return etag in (t.strip().removeprefix("W/") for t in header.split(","))
+
+
+def _set_cache_headers(response: Response, etag: Optional[str]) -> None:
+    response.headers["Cache-Control"] = CACHE_CONTROL
+    if etag is not None:
+        response.headers["ETag"] = etag
+
+
+def _not_modified_response(etag: str) -> Response:
+    return Response(
+        status_code=status.HTTP_304_NOT_MODIFIED,
+        headers={"ETag": etag, "Cache-Control": CACHE_CONTROL},
+    )
 
-    first_field, _ = _field_names()
-    first_name = kwargs.get(first_field)
-    last_name = kwargs.get("last_name")
-    if first_name and last_name:
-        first_col = getattr(models.Contact, first_field)
-        exists_name = (
-            db.query(models.Contact)
-            .filter(and_(first_col == first_name, models.Contact.last_name == last_name))
-            .first()
-        )
-        if exists_name:
-            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Contact with this name already exists")
+
+def _conflict_detail(exc: IntegrityError) -> str:
+    # PostgreSQL називає порушений індекс, SQLite — лише колонки
+    name = getattr(getattr(exc.orig, "diag", None), "constraint_name", None)
+    if name is None:
+        message = str(exc.orig)
+        if "contacts.email" in message:
+            name = "uq_contacts_email"
+        elif "contacts.last_name" in message:
+            name = "uq_contacts_name"
+    return CONFLICT_DETAILS.get(name, "Contact already exists")
 
 
 @router.post("/", response_model=schemas.Contact, status_code=status.HTTP_201_CREATED)
-def create_contact(
+async def create_contact(
     contact_in: schemas.ContactCreate,
-    db: Session = Depends(get_db),
+    on_conflict: Literal["error", "update"] = Query("error"),
+    db: AsyncSession = Depends(get_db),
     user: models.User = Depends(get_current_user),
 ):
+    """
+    Створює контакт.
+
+    Унікальність email та пари ім'я+прізвище забезпечують індекси БД, тож
+    запис — один INSERT без попередніх перевірок. З ``on_conflict=update``
+    контакт з тим самим email того ж власника оновлюється (upsert).
+
+    :param contact_in: Дані контакту.
+    :param on_conflict: ``error`` — 409 при дублікаті, ``update`` — upsert за email.
+    :return: Створений або оновлений контакт.
+    :raises HTTPException: 409 — якщо контакт уже існує (або email належить іншому користувачу).
+    """
     data = contact_in.dict(exclude_unset=True)
     kwargs = _to_model_kwargs(data)
     kwargs["owner_id"] = user.id
 
-    _check_duplicates_global(db, kwargs)
-
-    contact = models.Contact(**kwargs)
-    db.add(contact)
     try:
-        db.commit()
-    except IntegrityError:
-        db.rollback()
-        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Contact already exists")
-    db.refresh(contact)
+        if on_conflict == "update":
+            contact = await _upsert_contact(db, kwargs)
+        else:
+            contact = models.Contact(**kwargs)
+            db.add(contact)
+        await db.commit()
+    except IntegrityError as e:
+        await db.rollback()
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=_conflict_detail(e))
+    await bump_contacts_version(user.id)
+    return contact
+
+
+async def _upsert_contact(db: AsyncSession, kwargs: Dict[str, Any]) -> models.Contact:
+    dialect_insert = crud.dialect_insert(db)
+    if dialect_insert is None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Upsert is not supported")
+    stmt = dialect_insert(models.Contact).values(**kwargs)
+    changes = {k: v for k, v in kwargs.items() if k not in ("owner_id", "email")}
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[models.Contact.email],
+        index_where=crud.LIVE,
+        set_={**changes, "updated_at": models.db_utcnow()},
+        # чужий контакт з цим email не чіпаємо — RETURNING буде порожнім
+        where=models.Contact.owner_id == stmt.excluded.owner_id,
+    )
+    contact = await db.scalar(
+        stmt.returning(models.Contact).execution_options(populate_existing=True)
+    )
+    if contact is None:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=CONFLICT_DETAILS["uq_contacts_email"])
     return contact
 
 
+def _insert_ignoring_conflicts(db: AsyncSession):
+    dialect_insert = crud.dialect_insert(db)
+    if dialect_insert is None:
+        return insert(models.Contact)
+    return dialect_insert(models.Contact).on_conflict_do_nothing()
+
+
+async def _import_batch(db: AsyncSession, owner_id: int, batch: List[Tuple[int, schemas.ContactCreate]]) -> List[dict]:
+    """
+    Вставляє пакет контактів одним багаторядковим INSERT ... ON CONFLICT DO NOTHING.
+
+    Дублікати в межах пакета відсіюються до запиту, а з уже наявними в БД
+    (email або пара ім'я+прізвище) — унікальними індексами: рядки, яких
+    немає в RETURNING, позначаються як ``duplicate``.
+    """
+    first_field, _ = _field_names()
+    rows = []
+    for index, item in batch:
+        kwargs = _to_model_kwargs(item.model_dump())
+        kwargs["owner_id"] = owner_id
+        rows.append((index, kwargs))
+
+    taken_emails = set()
+    taken_names = set()
+
+    results: Dict[int, dict] = {}
+    to_insert: List[Tuple[int, Dict[str, Any]]] = []
+    for index, kw in rows:
+        name_key = (kw[first_field], kw["last_name"])
+        if kw["email"] in taken_emails or name_key in taken_names:
+            results[index] = {"index": index, "status": "duplicate", "detail": "Contact already exists"}
+            continue
+        taken_emails.add(kw["email"])
+        taken_names.add(name_key)
+        to_insert.append((index, kw))
+
+    if to_insert:
+        stmt = _insert_ignoring_conflicts(db).returning(models.Contact.id, models.Contact.email)
+        inserted = {email: cid for cid, email in await db.execute(stmt, [kw for _, kw in to_insert])}
+        await db.commit()
+        for index, kw in to_insert:
+            cid = inserted.get(kw["email"])
+            if cid is None:
+                results[index] = {"index": index, "status": "duplicate", "detail": "Contact already exists"}
+            else:
+                results[index] = {"index": index, "status": "created", "id": cid}
+
+    return [results[index] for index, _ in batch]
+
+
+async def _iter_lines(request: Request) -> AsyncIterator[str]:
+    """
+    Рядки тіла запиту разом із символом переносу рядка.
+
+    Декодер інкрементальний, тож символ UTF-8, розрізаний між фрагментами
+    тіла, склеюється; BOM на початку (експорт з Excel) відкидається.
+
+    :raises HTTPException: 400 — тіло не є коректним UTF-8.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+
+    def decode(data: bytes, final: bool = False) -> str:
+        try:
+            return decoder.decode(data, final)
+        except UnicodeDecodeError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Request body is not valid UTF-8")
+
+    tail = ""
+    async for chunk in request.stream():
+        tail += decode(chunk)
+        *lines, tail = tail.split("\n")
+        for line in lines:
+            yield line + "\n"
+    tail += decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+class _LineFeed:
+    """Черга рядків для ``csv.reader``, що поповнюється з асинхронного потоку."""
+
+    def __init__(self):
+        self.lines = deque()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> str:
+        if not self.lines:
+            raise StopIteration
+        return self.lines.popleft()
+
+
+async def _iter_csv_rows(request: Request) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Записи CSV одним ``csv.DictReader`` на весь потік.
+
+    Запис віддається читачу лише коли лапки в ньому збалансовані, тож поле
+    в лапках з переносом рядка не розривається на два записи.
+
+    :raises HTTPException: 400 — незакрите поле в лапках наприкінці тіла.
+    """
+    feed = _LineFeed()
+    reader = csv.DictReader(feed)
+    quotes = 0
+    async for line in _iter_lines(request):
+        if not quotes and not line.strip():
+            continue
+        feed.lines.append(line)
+        quotes += line.count('"')
+        if quotes % 2:
+            continue
+        quotes = 0
+        if reader.line_num == 0:
+            reader.fieldnames  # перший запис — заголовок; DictReader читає його ліниво
+            continue
+        row = next(reader)
+        yield {k: (v if v != "" else None) for k, v in row.items() if k is not None}
+    if quotes % 2:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Unterminated quoted field in CSV")
+
+
+async def _iter_bulk_rows(request: Request) -> AsyncIterator[Any]:
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    if content_type == "application/x-ndjson":
+        async for line in _iter_lines(request):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                yield None
+    elif content_type == "text/csv":
+        async for row in _iter_csv_rows(request):
+            yield row
+    else:
+        try:
+            payload = await request.json()
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid JSON body")
+        if not isinstance(payload, list):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Expected a JSON array")
+        for item in payload:
+            yield item
+
+
+@router.post(
+    "/bulk",
+    response_model=schemas.BulkImportResult,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/json": {
+                    "schema": {"type": "array", "items": {"$ref": "#/components/schemas/ContactCreate"}}
+                },
+                "application/x-ndjson": {"schema": {"type": "string"}},
+                "text/csv": {"schema": {"type": "string"}},
+            },
+        }
+    },
+)
+async def bulk_create_contacts(
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    user: models.User = Depends(get_current_user),
+):
+    """
+    Масовий імпорт контактів з JSON-масиву, NDJSON або CSV.
+
+    Рядки валідуються по одному і вставляються пакетами по ``BULK_BATCH_SIZE``;
+    кожен пакет комітиться окремо. Якщо потік обривається помилкою (понад
+    ``BULK_MAX_ROWS`` рядків, некоректний UTF-8 чи CSV), уже прочитані рядки
+    імпортуються, а відповідь зі статусом помилки містить звіт по них і
+    ``detail``. Версія контактів (ETag) оновлюється після будь-якого коміту.
+
+    :return: Звіт з результатом для кожного рядка (created/duplicate/invalid).
+    """
+    results: List[dict] = []
+    batch: List[Tuple[int, schemas.ContactCreate]] = []
+    index = 0
+    error: Optional[HTTPException] = None
+    try:
+        try:
+            async for raw in _iter_bulk_rows(request):
+                if index >= BULK_MAX_ROWS:
+                    raise HTTPException(
+                        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                        detail=f"At most {BULK_MAX_ROWS} contacts per request; rows from index {index} were not imported",
+                    )
+                try:
+                    batch.append((index, schemas.ContactCreate.model_validate(raw)))
+                except ValidationError as e:
+                    err = e.errors()[0]
+                    detail = f"{'.'.join(map(str, err['loc']))}: {err['msg']}" if err["loc"] else err["msg"]
+                    results.append({"index": index, "status": "invalid", "detail": detail})
+                index += 1
+                if len(batch) >= BULK_BATCH_SIZE:
+                    results.extend(await _import_batch(db, user.id, batch))
+                    batch = []
+        except HTTPException as e:
+            error = e
+        if batch:
+            results.extend(await _import_batch(db, user.id, batch))
+    finally:
+        # навіть якщо запит обірвався, закомічені пакети мають скинути ETag
+        if any(r["status"] == "created" for r in results):
+            await bump_contacts_version(user.id)
+
+    if error is not None and not results:
+        raise error
+    results.sort(key=lambda r: r["index"])
+    counts = {s: sum(1 for r in results if r["status"] == s) for s in ("created", "duplicate", "invalid")}
+    report = {
+        "created": counts["created"],
+        "duplicates": counts["duplicate"],
+        "invalid": counts["invalid"],
+        "results": results,
+    }
+    if error is not None:
+        report["detail"] = error.detail
+        return JSONResponse(status_code=error.status_code, content=jsonable_encoder(report), headers=error.headers)
+    return report
+
+
 @router.get("/", response_model=List[schemas.Contact])
-def read_contacts(
+async def read_contacts(
+    request: Request,
+    response: Response,
     search: Optional[str] = Query(None),
-    db: Session = Depends(get_db),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None),
+    db: AsyncSession = Depends(get_read_db),
     user: models.User = Depends(get_current_user),
 ):
-    q = _to_search_filter(db, user.id, search)
-    return q.order_by(models.Contact.id.asc()).all()
+    """
+    Повертає сторінку контактів користувача, впорядковану за id.
+
+    Пагінація курсорна (keyset по ``(owner_id, id)``): якщо є наступна
+    сторінка, її курсор повертається в заголовку ``X-Next-Cursor``.
+    На PostgreSQL пошук використовує trigram-індекси і повертає до ``limit``
+    найрелевантніших контактів без курсора.
+
+    :param search: Підрядок для пошуку в імені, прізвищі або email.
+    :param limit: Розмір сторінки.
+    :param cursor: Непрозорий курсор з попередньої відповіді.
+    :return: Список контактів або 304, якщо ``If-None-Match`` збігається
+        з поточною версією контактів користувача.
+    """
+    etag = await _contacts_etag(user.id, "list", search, limit, cursor)
+    if _not_modified(request, etag):
+        return _not_modified_response(etag)
+    _set_cache_headers(response, etag)
+
+    q = _to_search_filter(user.id, search)
+    if search:
+        first_field, _ = _field_names()
+        rank = crud.search_rank(
+            db,
+            search,
+            getattr(models.Contact, first_field),
+            models.Contact.last_name,
+            models.Contact.email,
+        )
+        if rank is not None:
+            return (await db.scalars(q.order_by(rank.desc(), models.Contact.id.asc()).limit(limit))).all()
+    if cursor:
+        (after_id,) = _decode_cursor(cursor, "id")
+        q = q.where(models.Contact.id > after_id)
+    contacts = (await db.scalars(q.order_by(models.Contact.id.asc()).limit(limit + 1))).all()
+
+    if len(contacts) > limit:
+        contacts = contacts[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = _encode_cursor(id=contacts[-1].id)
+    return contacts
+
+
+async def _iter_export(db: AsyncSession, owner_id: int, fmt: str) -> AsyncIterator[str]:
+    # get_db has already closed the session by the time the body is streamed;
+    # a closed Session stays usable, so it checks out a fresh connection here
+    # and is closed again once the export is finished.
+    stmt = (
+        select(models.Contact)
+        .where(models.Contact.owner_id == owner_id, crud.LIVE)
+        .order_by(models.Contact.id.asc())
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+    )
+    fields = list(schemas.Contact.model_fields)
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=fields)
+    if fmt == "csv":
+        writer.writeheader()
+    try:
+        result = await db.stream_scalars(stmt)
+        async for partition in result.partitions():
+            for contact in partition:
+                item = schemas.Contact.model_validate(contact)
+                if fmt == "csv":
+                    writer.writerow(item.model_dump(mode="json"))
+                else:
+                    buf.write(item.model_dump_json())
+                    buf.write("\n")
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+        if buf.tell():
+            yield buf.getvalue()
+    finally:
+        await db.close()
+
+
+@router.get("/export")
+async def export_contacts(
+    fmt: Literal["ndjson", "csv"] = Query("ndjson", alias="format"),
+    db: AsyncSession = Depends(get_read_db),
+    user: models.User = Depends(get_current_user),
+):
+    """
+    Потоково віддає всі контакти користувача у форматі NDJSON або CSV.
+
+    Рядки читаються серверним курсором пакетами по ``EXPORT_BATCH_SIZE``,
+    тож пам'ять не залежить від кількості контактів.
+
+    :param fmt: Формат експорту: ``ndjson`` або ``csv``.
+    :return: StreamingResponse з файлом експорту.
+    """
+    return StreamingResponse(
+        _iter_export(db, user.id, fmt),
+        media_type=EXPORT_MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="contacts.{fmt}"'},
+    )
+
+
+@router.get("/upcoming-birthdays", response_model=List[schemas.Contact])
+async def upcoming_birthdays(
+    response: Response,
+    days: int = Query(7, ge=1, le=366),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None),
+    db: AsyncSession = Depends(get_read_db),
+    user: models.User = Depends(get_current_user),
+):
+    """
+    Повертає контакти з днем народження в найближчі ``days`` днів.
+
+    Фільтрація і сортування за найближчою датою виконуються в SQL по
+    індексованому ``birthday_md``; наступна сторінка — через ``X-Next-Cursor``.
+
+    :param days: Кількість днів наперед.
+    :param limit: Розмір сторінки.
+    :param cursor: Непрозорий курсор з попередньої відповіді.
+    :return: Список контактів, впорядкований за найближчим днем народження.
+    """
+    today = date.today()
+    after = _decode_cursor(cursor, "key", "id") if cursor else None
+    contacts = await crud.get_upcoming_birthdays(db, user.id, days, today=today, after=after, limit=limit + 1)
+
+    if len(contacts) > limit:
+        contacts = contacts[:limit]
+        last = contacts[-1]
+        response.headers[NEXT_CURSOR_HEADER] = _encode_cursor(key=crud.next_birthday_key(last, today), id=last.id)
+    return contacts
+
+
+@router.get("/changes", response_model=schemas.ContactChanges)
+async def contact_changes(
+    since: Optional[str] = Query(None),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_read_db),
+    user: models.User = Depends(get_current_user),
+):
+    """
+    Повертає контакти, створені, змінені або видалені після водяного знака.
+
+    Читання йде по індексу ``(owner_id, updated_at)``, тож обсяг відповіді
+    залежить від кількості змін, а не від розміру адресної книги. Видалені
+    контакти повертаються лише як id з надгробків. ``updated_at`` ставить
+    годинник БД, а зміни, молодші за ``CONTACT_CHANGES_SETTLE_SECONDS``,
+    відкладаються до наступного запиту: транзакція, що ще не закомітилась,
+    не з'явиться позаду вже виданого водяного знака.
+
+    :param since: Водяний знак з попередньої відповіді; без нього — усі контакти.
+    :param limit: Максимальна кількість змін у відповіді.
+    :return: Змінені контакти, id видалених, новий водяний знак і ``has_more``.
+    """
+    after = _decode_watermark(since) if since else None
+    until = models.db_utcnow(-CHANGES_SETTLE.total_seconds())
+    rows = await crud.get_changes(db, user.id, after=after, until=until, limit=limit + 1)
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if rows:
+        since = _encode_watermark(rows[-1])
+    return {
+        "updated": [c for c in rows if c.deleted_at is None],
+        "deleted": [c.id for c in rows if c.deleted_at is not None],
+        "since": since or _encode_cursor(ts=0, id=0),
+        "has_more": has_more,
+    }
 
 
 @router.get("/{contact_id}", response_model=schemas.Contact)
-def read_contact(
+async def read_contact(
     contact_id: int,
-    db: Session = Depends(get_db),
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_read_db),
     user: models.User = Depends(get_current_user),
 ):
-    contact = db.get(models.Contact, contact_id)
-    if not contact:
+    etag = await _contacts_etag(user.id, "item", contact_id)
+    if _not_modified(request, etag):
+        return _not_modified_response(etag)
+    _set_cache_headers(response, etag)
+
+    contact = await db.get(models.Contact, contact_id)
+    if not contact or contact.deleted_at is not None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not found")
     _ensure_owner(contact.owner_id, user.id)
     return contact
 
 
 @router.patch("/{contact_id}", response_model=schemas.Contact)
-def update_contact(
+async def update_contact(
     contact_id: int,
     contact_in: schemas.ContactUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     user: models.User = Depends(get_current_user),
 ):
-    contact = db.get(models.Contact, contact_id)
-    if not contact:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not found")
-    _ensure_owner(contact.owner_id, user.id)
-
     data = contact_in.dict(exclude_unset=True)
     kwargs = _to_model_kwargs(data)
-
-    tmp = {}
-    tmp.update({k: getattr(contact, k) for k in contact.__table__.columns.keys() if hasattr(contact, k)})
-    tmp.update(kwargs)
-    _check_duplicates_global(db, tmp)
-
-    for k, v in kwargs.items():
-        setattr(contact, k, v)
-    db.commit()
-    db.refresh(contact)
+    if not kwargs:
+        contact = await crud.get_contact(db, contact_id, user.id)
+        if not contact:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not found")
+        return contact
+
+    # один UPDATE ... RETURNING: власник і надгробок перевіряються в WHERE
+    stmt = (
+        update(models.Contact)
+        .where(models.Contact.id == contact_id, models.Contact.owner_id == user.id, crud.LIVE)
+        .values(**kwargs)
+        .returning(models.Contact)
+        .execution_options(populate_existing=True)
+    )
+    try:
+        contact = await db.scalar(stmt)
+        await db.commit()
+    except IntegrityError as e:
+        await db.rollback()
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=_conflict_detail(e))
+    if contact is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not found")
+    await bump_contacts_version(user.id)
     return contact
 
 
 @router.delete("/{contact_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_contact(
+async def delete_contact(
     contact_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     user: models.User = Depends(get_current_user),
 ):
-    contact = db.get(models.Contact, contact_id)
-    if not contact:
+    contact = await db.get(models.Contact, contact_id)
+    if not contact or contact.deleted_at is not None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not found")
     _ensure_owner(contact.owner_id, user.id)
-    db.delete(contact)
-    db.commit()
+    crud.soft_delete_contact(contact)
+    await db.commit()
+    await bump_contacts_version(user.id)
     return None
-
-
-@router.get("/upcoming-birthdays", response_model=List[schemas.Contact])
-def upcoming_birthdays(
-    days: int = Query(7, ge=1, le=366),
-    db: Session = Depends(get_db),
-    user: models.User = Depends(get_current_user),
-):
-    today = date.today()
-    end = today + timedelta(days=days)
-    contacts = db.query(models.Contact).filter(models.Contact.owner_id == user.id).all()
-
-    def next_bday(d: date) -> date:
-        year = today.year
-        nb = date(year, d.month, d.day)
-        if nb < today:
-            nb = date(year + 1, d.month, d.day)
-        return nb
-
-    result: List[models.Contact] = []
-    for c in contacts:
-        if c.birthday is None:
-            continue
-        nb = next_bday(c.birthday)
-        if today <= nb <= end:
-            result.append(c)
-    return result
-
@@ -1,56 +1,126 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import and_, case, func, or_, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import date, timedelta
 from app import models, schemas
 
-def get_contact(db: Session, contact_id: int, owner_id: int):
-    return db.query(models.Contact).filter(models.Contact.id == contact_id, models.Contact.owner_id == owner_id).first()
+SEARCH_LIMIT = 50
 
-def get_contact_by_email(db: Session, email: str, owner_id: int):
-    return db.query(models.Contact).filter(models.Contact.email == email, models.Contact.owner_id == owner_id).first()
+# deleted contacts stay behind as tombstones (deleted_at set) so delta sync can report them
+LIVE = models.Contact.deleted_at.is_(None)
 
-def get_contacts(db: Session, owner_id: int, skip: int = 0, limit: int = 100,
-                 name: str | None = None, last_name: str | None = None, email: str | None = None):
-    q = db.query(models.Contact).filter(models.Contact.owner_id == owner_id)
-    if name: q = q.filter(models.Contact.name.ilike(f"%{name}%"))
-    if last_name: q = q.filter(models.Contact.last_name.ilike(f"%{last_name}%"))
-    if email: q = q.filter(models.Contact.email.ilike(f"%{email}%"))
-    return q.offset(skip).limit(limit).all()
+def dialect_insert(db: AsyncSession):
+    # INSERT with ON CONFLICT support; None on dialects without it
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql": return postgresql.insert
+    if dialect == "sqlite": return sqlite.insert
+    return None
 
-def create_contact(db: Session, contact: schemas.ContactCreate, owner_id: int):
+async def get_contact(db: AsyncSession, contact_id: int, owner_id: int):
+    return await db.scalar(select(models.Contact).where(models.Contact.id == contact_id, models.Contact.owner_id == owner_id, LIVE))
+
+async def get_contact_by_email(db: AsyncSession, email: str, owner_id: int):
+    return await db.scalar(select(models.Contact).where(models.Contact.email == email, models.Contact.owner_id == owner_id, LIVE))
+
+async def get_contacts(db: AsyncSession, owner_id: int, after_id: int | None = None, limit: int = 100,
+                       name: str | None = None, last_name: str | None = None, email: str | None = None):
+    # keyset pagination over (owner_id, id): pass the last id of the previous page as after_id
+    q = select(models.Contact).where(models.Contact.owner_id == owner_id, LIVE)
+    if after_id is not None: q = q.where(models.Contact.id > after_id)
+    if name: q = q.where(models.Contact.name.ilike(f"%{name}%"))
+    if last_name: q = q.where(models.Contact.last_name.ilike(f"%{last_name}%"))
+    if email: q = q.where(models.Contact.email.ilike(f"%{email}%"))
+    return (await db.scalars(q.order_by(models.Contact.id.asc()).limit(limit))).all()
+
+async def create_contact(db: AsyncSession, contact: schemas.ContactCreate, owner_id: int):
     db_contact = models.Contact(owner_id=owner_id, **contact.dict())
-    db.add(db_contact); db.commit(); db.refresh(db_contact)
+    db.add(db_contact); await db.commit(); await db.refresh(db_contact)
     return db_contact
 
-def update_contact(db: Session, contact_id: int, owner_id: int, updates: schemas.ContactUpdate):
-    db_contact = get_contact(db, contact_id, owner_id)
+async def update_contact(db: AsyncSession, contact_id: int, owner_id: int, updates: schemas.ContactUpdate):
+    db_contact = await get_contact(db, contact_id, owner_id)
     if not db_contact: return None
     data = updates.dict(exclude_unset=True)
     for k, v in data.items(): setattr(db_contact, k, v)
-    db.add(db_contact); db.commit(); db.refresh(db_contact)
+    db.add(db_contact); await db.commit(); await db.refresh(db_contact)
     return db_contact
 
-def delete_contact(db: Session, contact_id: int, owner_id: int) -> bool:
-    db_contact = get_contact(db, contact_id, owner_id)
+async def delete_contact(db: AsyncSession, contact_id: int, owner_id: int) -> bool:
+    db_contact = await get_contact(db, contact_id, owner_id)
     if not db_contact: return False
-    db.delete(db_contact); db.commit()
+    soft_delete_contact(db_contact); await db.commit()
     return True
 
-def get_upcoming_birthdays(db: Session, owner_id: int, days: int = 7):
-    from datetime import date
-    today = date.today(); end = today + timedelta(days=days)
-    results = []
-    contacts = db.query(models.Contact).filter(models.Contact.owner_id == owner_id, models.Contact.birthday.isnot(None)).all()
-    for c in contacts:
-        bday_this_year = c.birthday.replace(year=today.year)
-        next_bday = bday_this_year if bday_this_year >= today else c.birthday.replace(year=today.year + 1)
-        if today <= next_bday <= end:
-            results.append((next_bday, c))
-    results.sort(key=lambda t: t[0])
-    return [c for _, c in results]
-
-def search_contacts(db: Session, owner_id: int, query: str):
-    return db.query(models.Contact).filter(
+def soft_delete_contact(contact: models.Contact) -> None:
+    contact.deleted_at = models.utcnow()
+
+async def get_changes(db: AsyncSession, owner_id: int, after: tuple | None = None, until=None, limit: int = 100):
+    # keyset over (owner_id, updated_at, id), tombstones included; `after` is the (updated_at, id) of the last row seen
+    q = select(models.Contact).where(models.Contact.owner_id == owner_id)
+    if after is not None:
+        ts, last_id = after
+        q = q.where(or_(models.Contact.updated_at > ts, and_(models.Contact.updated_at == ts, models.Contact.id > last_id)))
+    if until is not None: q = q.where(models.Contact.updated_at <= until)
+    q = q.order_by(models.Contact.updated_at.asc(), models.Contact.id.asc())
+    return (await db.scalars(q.limit(limit))).all()
+
+def birthday_window(days: int, today: date | None = None):
+    """
+    Returns (filter, sort key) over Contact.birthday_md for birthdays in the next `days` days.
+
+    The window wraps around the new year in SQL; the sort key orders by next occurrence.
+    Feb 29 (229) sorts between Feb 28 and Mar 1, so non-leap years still pick it up.
+    """
+    today = today or date.today(); end = today + timedelta(days=days)
+    md = models.Contact.birthday_md
+    start_key, end_key = models.birthday_key(today), models.birthday_key(end)
+    if end.year == today.year: window = md.between(start_key, end_key)
+    else: window = or_(md >= start_key, md <= end_key)
+    next_occurrence = case((md >= start_key, md), else_=md + 1300)
+    return window, next_occurrence
+
+def next_birthday_key(contact: models.Contact, today: date | None = None) -> int:
+    # Python mirror of the sort key from birthday_window, used to build page cursors
+    start_key = models.birthday_key(today or date.today())
+    return contact.birthday_md if contact.birthday_md >= start_key else contact.birthday_md + 1300
+
+async def get_upcoming_birthdays(db: AsyncSession, owner_id: int, days: int = 7, today: date | None = None,
+                                 after: tuple[int, int] | None = None, limit: int | None = None):
+    # `after` is the (next occurrence key, id) of the last row of the previous page
+    window, next_occurrence = birthday_window(days, today)
+    q = select(models.Contact).where(models.Contact.owner_id == owner_id, LIVE, window)
+    if after is not None:
+        key, last_id = after
+        q = q.where(or_(next_occurrence > key, and_(next_occurrence == key, models.Contact.id > last_id)))
+    q = q.order_by(next_occurrence.asc(), models.Contact.id.asc())
+    if limit is not None: q = q.limit(limit)
+    return (await db.scalars(q)).all()
+
+def search_rank(db: AsyncSession, query: str, *columns):
+    # pg_trgm similarity, served by the GIN trigram indexes; None on other dialects (SQLite in tests)
+    if db.get_bind().dialect.name != "postgresql":
+        return None
+    columns = columns or (models.Contact.name, models.Contact.last_name, models.Contact.email)
+    return func.greatest(*(func.similarity(col, query) for col in columns))
+
+async def search_contacts(db: AsyncSession, owner_id: int, query: str, limit: int = SEARCH_LIMIT):
+    q = select(models.Contact).where(
         models.Contact.owner_id == owner_id,
+        LIVE,
         models.Contact.name.ilike(f"%{query}%")
-    ).all()
+    )
+    rank = search_rank(db, query, models.Contact.name)
+    order = (rank.desc(), models.Contact.id.asc()) if rank is not None else (models.Contact.id.asc(),)
+    return (await db.scalars(q.order_by(*order).limit(limit))).all()
+
+async def get_avatar_blob(db: AsyncSession, digest: str):
+    return await db.get(models.AvatarBlob, digest)
 
+async def save_avatar_blob(db: AsyncSession, digest: str, content_type: str, variants: dict) -> None:
+    # concurrent uploads of the same image race here; the first row wins, both point at the same files
+    values = {"digest": digest, "content_type": content_type, "variants": variants}
+    insert_ = dialect_insert(db)
+    if insert_ is None:
+        if await get_avatar_blob(db, digest) is None: db.add(models.AvatarBlob(**values))
+        return
+    await db.execute(insert_(models.AvatarBlob).values(**values).on_conflict_do_nothing(index_elements=["digest"]))
@@ -1,19 +1,200 @@
-import os
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+import threading
+import time
 
-SQLALCHEMY_DATABASE_URL = os.getenv(
-    "DATABASE_URL",
-    "postgresql://postgres:postgres@db:5432/contacts_db"
-)
+from fastapi import Request
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from app import profiling
+from app.cache import mark_primary_sticky
+from app.config import settings
+
+SQLALCHEMY_DATABASE_URL = settings.DATABASE_URL
+SQLALCHEMY_REPLICA_URL = settings.DATABASE_REPLICA_URL
+
+
+class PoolStats:
+    """Лічильники пулу з'єднань: checkout/checkin, нові з'єднання, час очікування."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.checkins = 0
+        self.connects = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def record_wait(self, seconds: float, timed_out: bool = False) -> None:
+        with self._lock:
+            self.wait_total += seconds
+            self.wait_max = max(self.wait_max, seconds)
+            if timed_out:
+                self.timeouts += 1
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            waits = self.checkouts + self.timeouts
+            return {
+                "checkouts": self.checkouts,
+                "checkins": self.checkins,
+                "connects": self.connects,
+                "timeouts": self.timeouts,
+                "wait_avg_ms": self.wait_total / waits * 1000 if waits else 0.0,
+                "wait_max_ms": self.wait_max * 1000,
+            }
+
+
+pool_stats = PoolStats()
+replica_pool_stats = PoolStats()
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """Черга з'єднань, що вимірює, скільки checkout чекав на вільне з'єднання."""
+
+    stats: PoolStats = pool_stats
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except PoolTimeoutError:
+            self.stats.record_wait(time.perf_counter() - started, timed_out=True)
+            raise
+        self.stats.record_wait(time.perf_counter() - started)
+        return conn
+
+
+class ReplicaQueuePool(InstrumentedQueuePool):
+    stats = replica_pool_stats
+
+
+def _engine_kwargs(url: str, poolclass: type = InstrumentedQueuePool) -> dict:
+    # SQLite (tests, benchmarks) keeps SQLAlchemy's default pool for its driver
+    if url.startswith("sqlite"):
+        return {}
+    return {
+        "poolclass": poolclass,
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
+
+
+def _count_pool_events(engine, stats: PoolStats) -> None:
+    def on_connect(dbapi_connection, connection_record):
+        stats.connects += 1
+
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        stats.checkouts += 1
+
+    def on_checkin(dbapi_connection, connection_record):
+        stats.checkins += 1
+
+    event.listen(engine.sync_engine, "connect", on_connect)
+    event.listen(engine.sync_engine, "checkout", on_checkout)
+    event.listen(engine.sync_engine, "checkin", on_checkin)
+
+
+engine = create_async_engine(SQLALCHEMY_DATABASE_URL, **_engine_kwargs(SQLALCHEMY_DATABASE_URL))
+SessionLocal = async_sessionmaker(engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+_count_pool_events(engine, pool_stats)
+
+# Необов'язкова репліка для читання; без DATABASE_REPLICA_URL усе йде в основну БД
+replica_engine = None
+ReplicaSessionLocal = None
+if SQLALCHEMY_REPLICA_URL:
+    replica_engine = create_async_engine(
+        SQLALCHEMY_REPLICA_URL, **_engine_kwargs(SQLALCHEMY_REPLICA_URL, ReplicaQueuePool)
+    )
+    ReplicaSessionLocal = async_sessionmaker(
+        replica_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+    )
+    _count_pool_events(replica_engine, replica_pool_stats)
+
+if settings.DB_PROFILE:
+    profiling.instrument(engine)
+    if replica_engine is not None:
+        profiling.instrument(replica_engine)
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
-def get_db():
-    db = SessionLocal()
-    try:
+
+def replica_enabled() -> bool:
+    return ReplicaSessionLocal is not None
+
+
+SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+
+class PrimaryStickyMiddleware:
+    """
+    ASGI-middleware read-your-writes: після запиту на запис прив'язує читання
+    користувача до основної БД на ``DB_REPLICA_STICKY_SECONDS``.
+
+    Мітка ставиться на початку відповіді, коли маршрут уже закомітив зміни,
+    тож вікно відраховується від коміту, а не від початку довгого запису.
+    Статус відповіді не перевіряється: частковий імпорт повертає 4xx, хоча
+    частину рядків уже закомічено.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] in SAFE_METHODS:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and replica_enabled():
+                # principal кладе сюди get_current_user (request.state.user)
+                user = scope.get("state", {}).get("user")
+                if user is not None:
+                    await mark_primary_sticky(user.id)
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+
+def pool_status(target=None, stats: PoolStats = pool_stats) -> dict:
+    """
+    Стан пулу з'єднань engine для ендпоінта метрик.
+
+    :param target: AsyncEngine; за замовчуванням основний ``engine``.
+    :param stats: Лічильники цього пулу.
+    :return: Розмір пулу, зайняті/вільні з'єднання, overflow і лічильники ``stats``.
+    """
+    pool = (target or engine).sync_engine.pool
+    status = {"pool": type(pool).__name__}
+    for name in ("size", "checkedin", "checkedout", "overflow"):
+        method = getattr(pool, name, None)
+        if method is not None:
+            status[name] = method()
+    status.update(stats.as_dict())
+    return status
+
+
+async def get_db(request: Request):
+    """
+    Одна сесія (unit of work) на запит.
+
+    Сесія зберігається в ``request.state.db`` разом з principal
+    (``request.state.user``), тож залежності, що запитують її повторно,
+    отримують той самий об'єкт, а не відкривають нову сесію.
+    """
+    db = getattr(request.state, "db", None)
+    if db is not None:
         yield db
-    finally:
-        db.close()
+        return
+    async with SessionLocal() as db:
+        request.state.db = db
+        try:
+            yield db
+        finally:
+            request.state.db = None
@@ -1,12 +1,14 @@
 from fastapi import Depends, HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import database
 from app.auth import get_current_user
+from app.cache import is_primary_sticky
+from app.database import get_db
 from app.models import User
 
 
 async def require_admin(current: User = Depends(get_current_user)):
-    if current is None:
-        raise HTTPException(status_code=401, detail="Not authenticated")
-
     role_value = current.role.value if hasattr(current.role, "value") else str(current.role)
 
     if role_value != "admin":
@@ -15,3 +17,24 @@ async def require_admin(current: User = Depends(get_current_user)):
             detail="Admins only",
         )
     return current
+
+
+def user_rate_key(current: User = Depends(get_current_user)) -> str:
+    return f"user:{current.id}"
+
+
+async def get_read_db(
+    db: AsyncSession = Depends(get_db),
+    current: User = Depends(get_current_user),
+):
+    """
+    Сесія для маршрутів, що лише читають.
+
+    Повертає сесію репліки, якщо вона налаштована і користувач нещодавно
+    нічого не записував; інакше — сесію основної БД.
+    """
+    if not database.replica_enabled() or await is_primary_sticky(current.id):
+        yield db
+        return
+    async with database.ReplicaSessionLocal() as replica:
+        yield replica
@@ -0,0 +1,177 @@
+"""
+Щоденний дайджест днів народження.
+
+Один прохід по ``contacts JOIN users`` у вікні найближчих днів, один лист
+на користувача. Прогрес зберігається в ``job_checkpoints`` після кожного
+пакета користувачів, тож перерваний запуск продовжується з місця зупинки.
+Листи не надсилаються напряму, а ставляться в чергу ``mail_outbox``
+(див. ``app.outbox``) у тій самій транзакції, що й контрольна точка пакета:
+після падіння повторний запуск не поставить у чергу жодного листа вдруге.
+
+Запуск::
+
+    python -m app.digest --days 7
+"""
+import argparse
+import asyncio
+import logging
+import time
+from datetime import date
+from typing import Optional
+
+from fastapi_mail import MessageSchema
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app import crud, models
+from app.database import SessionLocal
+from app.outbox import enqueue_message
+
+logger = logging.getLogger(__name__)
+
+JOB_NAME = "birthday_digest"
+DEFAULT_DAYS = 7
+CHUNK_SIZE = 100
+STREAM_BATCH_SIZE = 1000
+
+
+def _digest_query(days: int, today: date, after_user_id: int):
+    window, next_occurrence = crud.birthday_window(days, today)
+    return (
+        select(
+            models.User.id,
+            models.User.email,
+            models.Contact.name,
+            models.Contact.last_name,
+            models.Contact.birthday,
+        )
+        .join(models.Contact, models.Contact.owner_id == models.User.id)
+        .where(window, crud.LIVE, models.User.is_verified == 1, models.User.id > after_user_id)
+        .order_by(models.User.id, next_occurrence, models.Contact.id)
+        .execution_options(yield_per=STREAM_BATCH_SIZE)
+    )
+
+
+def _build_message(email: str, rows, days: int) -> MessageSchema:
+    lines = [f"- {name} {last_name}: {bday:%d.%m}" for _, _, name, last_name, bday in rows]
+    return MessageSchema(
+        subject=f"Upcoming birthdays in the next {days} days",
+        recipients=[email],
+        body="\n".join(lines),
+        subtype="plain",
+    )
+
+
+async def _load_checkpoint(session_factory: async_sessionmaker, today: date) -> models.JobCheckpoint:
+    async with session_factory() as db:
+        checkpoint = await db.get(models.JobCheckpoint, (JOB_NAME, today))
+        if checkpoint is None:
+            checkpoint = models.JobCheckpoint(job=JOB_NAME, run_date=today, last_user_id=0, completed=False)
+            db.add(checkpoint)
+            await db.commit()
+        await db.refresh(checkpoint)
+        db.expunge(checkpoint)
+        return checkpoint
+
+
+async def _save_checkpoint(db: AsyncSession, today: date, last_user_id: int, completed: bool = False):
+    # один коміт із листами пакета, що вже додані в ``db``
+    checkpoint = await db.get(models.JobCheckpoint, (JOB_NAME, today))
+    checkpoint.last_user_id = last_user_id
+    checkpoint.completed = completed
+    await db.commit()
+
+
+async def _send(mailer, db: AsyncSession, user_rows: list, days: int, stats: dict) -> None:
+    user_id, email = user_rows[0][0], user_rows[0][1]
+    message = _build_message(email, user_rows, days)
+    try:
+        if mailer is None:
+            enqueue_message(db, message)
+        else:
+            await mailer.send_message(message)
+        stats["sent"] += 1
+    except Exception:
+        logger.exception("birthday digest for user %s failed", user_id)
+        stats["failed"] += 1
+    stats["users"] += 1
+    stats["contacts"] += len(user_rows)
+
+
+async def run_digest(
+    days: int = DEFAULT_DAYS,
+    today: Optional[date] = None,
+    chunk_size: int = CHUNK_SIZE,
+    session_factory: async_sessionmaker = SessionLocal,
+    mailer=None,
+) -> dict:
+    """
+    Надсилає кожному підтвердженому користувачу лист з найближчими днями народження.
+
+    :param days: Розмір вікна в днях.
+    :param today: Дата запуску (ключ контрольної точки); за замовчуванням сьогодні.
+    :param chunk_size: Кількість користувачів між комітами контрольної точки.
+    :param session_factory: Фабрика сесій SQLAlchemy.
+    :param mailer: Об'єкт з ``send_message``; за замовчуванням листи ставляться в ``mail_outbox``
+        разом з контрольною точкою пакета. Листи через ``mailer`` після падіння
+        можуть повторитися для користувачів з незакоміченого пакета.
+    :return: Метрики запуску.
+    """
+    today = today or date.today()
+    checkpoint = await _load_checkpoint(session_factory, today)
+    stats = {
+        "run_date": today.isoformat(),
+        "resumed_after_user_id": checkpoint.last_user_id,
+        "users": 0,
+        "contacts": 0,
+        "sent": 0,
+        "failed": 0,
+    }
+    if checkpoint.completed:
+        logger.info("birthday digest for %s already completed", today)
+        stats["skipped"] = True
+        return stats
+
+    started = time.perf_counter()
+    last_user_id = checkpoint.last_user_id
+    user_rows: list = []
+    # потік читається однією сесією, листи й контрольна точка пишуться іншою
+    async with session_factory() as db, session_factory() as writer:
+        rows = await db.stream(_digest_query(days, today, last_user_id))
+        async for row in rows:
+            if user_rows and row[0] != user_rows[0][0]:
+                await _send(mailer, writer, user_rows, days, stats)
+                last_user_id = user_rows[0][0]
+                user_rows = []
+                if stats["users"] % chunk_size == 0:
+                    await _save_checkpoint(writer, today, last_user_id)
+                    logger.info(
+                        "birthday digest: %d users, %.1f users/s",
+                        stats["users"],
+                        stats["users"] / (time.perf_counter() - started),
+                    )
+            user_rows.append(row)
+        if user_rows:
+            await _send(mailer, writer, user_rows, days, stats)
+            last_user_id = user_rows[0][0]
+        await _save_checkpoint(writer, today, last_user_id, completed=True)
+    elapsed = time.perf_counter() - started
+    stats["elapsed_seconds"] = round(elapsed, 3)
+    stats["users_per_second"] = round(stats["users"] / elapsed, 1) if elapsed else 0.0
+    stats["contacts_per_second"] = round(stats["contacts"] / elapsed, 1) if elapsed else 0.0
+    logger.info("birthday digest finished: %s", stats)
+    return stats
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Send the daily birthday digest.")
+    parser.add_argument("--days", type=int, default=DEFAULT_DAYS)
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    print(asyncio.run(run_digest(days=args.days, chunk_size=args.chunk_size)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from passlib.context import CryptContext
+
+
+class PasswordHasherBusy(Exception):
+    """Черга хешування паролів переповнена."""
+
+
+class PasswordHasher:
+    """
+    Виконує bcrypt у власному обмеженому пулі потоків.
+
+    bcrypt відпускає GIL, тож кілька потоків дають реальний паралелізм, а
+    обмеження ``max_pending`` не дає сплеску логінів зайняти всі потоки
+    воркера: зайві запити одразу отримують ``PasswordHasherBusy``.
+    """
+
+    def __init__(self, context: CryptContext, workers: int, max_pending: int):
+        self.context = context
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._running = 0
+        self.completed = 0
+        self.rejected = 0
+        self.total_seconds = 0.0
+
+    def hash(self, plain: str) -> str:
+        return self._submit(self.context.hash, plain)
+
+    def verify(self, plain: str, hashed: str) -> bool:
+        return self._submit(self.context.verify, plain, hashed)
+
+    async def hash_async(self, plain: str) -> str:
+        return await self._submit_async(self.context.hash, plain)
+
+    async def verify_async(self, plain: str, hashed: str) -> bool:
+        return await self._submit_async(self.context.verify, plain, hashed)
+
+    def _reserve(self) -> None:
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.rejected += 1
+                raise PasswordHasherBusy()
+            self._pending += 1
+
+    def _release(self, _future=None) -> None:
+        with self._lock:
+            self._pending -= 1
+
+    def _submit(self, fn, *args):
+        self._reserve()
+        try:
+            return self._executor.submit(self._timed, fn, *args).result()
+        finally:
+            self._release()
+
+    async def _submit_async(self, fn, *args):
+        self._reserve()
+        try:
+            future = self._executor.submit(self._timed, fn, *args)
+        except BaseException:
+            self._release()
+            raise
+        # слот звільняє завершення задачі в пулі, а не корутина, що її чекає:
+        # скасований запит (клієнт відключився) не повинен занижувати лічильник
+        future.add_done_callback(self._release)
+        return await asyncio.wrap_future(future)
+
+    def _timed(self, fn, *args):
+        with self._lock:
+            self._running += 1
+        started = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self._running -= 1
+                self.completed += 1
+                self.total_seconds += elapsed
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "running": self._running,
+                "queued": self._pending - self._running,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "avg_ms": self.total_seconds / self.completed * 1000 if self.completed else 0.0,
+            }
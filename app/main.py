@@ -1,15 +1,21 @@
 import asyncio
-import redis.asyncio as redis
+import logging
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.openapi.utils import get_openapi
-from fastapi_limiter import FastAPILimiter
+from fastapi.staticfiles import StaticFiles
 import cloudinary
 
 from app.config import settings
 from app.auth import router as auth_router
 from app.users import router as users_router
-from app.database import engine
+from app.admin import router as admin_router
+from app.cache import get_redis, listen_for_invalidations
+from app import outbox
+from app import database
+from app.database import PrimaryStickyMiddleware, engine
+from app.metrics import MetricsMiddleware, instrument_engine, router as metrics_router
+from app.profiling import QueryProfileMiddleware
 from app.models import Base 
 
 contacts_router = None
@@ -21,6 +27,8 @@ except ModuleNotFoundError:
     except ModuleNotFoundError:
         contacts_router = None
 
+logger = logging.getLogger(__name__)
+
 app = FastAPI(title="Contacts API", version="1.0.0")
 
 @app.get("/")
@@ -33,28 +41,53 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(PrimaryStickyMiddleware)
+if settings.DB_PROFILE:
+    app.add_middleware(QueryProfileMiddleware)
+
+if settings.AVATAR_STORAGE == "local":
+    app.mount(settings.AVATAR_LOCAL_URL, StaticFiles(directory=settings.AVATAR_LOCAL_DIR, check_dir=False), name="media")
+
+instrument_engine(engine)
+if database.replica_engine is not None:
+    instrument_engine(database.replica_engine)
 
 @app.on_event("startup")
 async def startup():
-    Base.metadata.create_all(bind=engine)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
 
     cloudinary.config(cloudinary_url=settings.CLOUDINARY_URL)
 
     for _ in range(10):
         try:
-            r = await redis.from_url(
-                settings.REDIS_URL,
-                encoding="utf-8",
-                decode_responses=True,
-            )
-            await FastAPILimiter.init(r)
+            await (await get_redis()).ping()
             break
         except Exception:
             await asyncio.sleep(1)
+    else:
+        # ліміти працюють і без Redis, але лише в межах процесу (або 503 при fail-closed)
+        logger.warning("Redis is unreachable; rate limits are not shared between workers")
+
+    app.state.cache_listener = asyncio.create_task(listen_for_invalidations())
+    if settings.MAIL_OUTBOX_IN_PROCESS:
+        app.state.mail_worker = asyncio.create_task(outbox.worker.run())
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    for name in ("cache_listener", "mail_worker"):
+        task = getattr(app.state, name, None)
+        if task:
+            task.cancel()
 
 app.include_router(auth_router)
 app.include_router(users_router)
+app.include_router(admin_router)
+app.include_router(metrics_router)
 if contacts_router:
     app.include_router(contacts_router)
 
@@ -0,0 +1,279 @@
+"""
+Метрики застосунку у текстовому форматі Prometheus (``GET /metrics``).
+
+HTTP-метрики і лічильники запитів до БД оновлюються лише в потоці event
+loop (ASGI-middleware і події SQLAlchemy, що виконуються в greenlet того ж
+потоку), тож обходяться без блокувань. Кеш, bcrypt, пул з'єднань, ліміти і
+черга пошти мають власні лічильники — вони читаються під час scrape.
+"""
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from fastapi import APIRouter, HTTPException, Request, Response, status
+from sqlalchemy import event
+
+from app import database
+from app.auth import hasher
+from app.cache import user_cache_stats
+from app.config import settings
+from app.outbox import worker as mail_worker
+from app.ratelimit import rate_limit_stats
+from app.revocation import revocation_stats
+from app.tokens import token_cache_stats
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+UNMATCHED_ROUTE = "unmatched"
+
+# [кількість запитів, секунд у БД] поточного HTTP-запиту
+_request_db: ContextVar[Optional[List]] = ContextVar("request_db", default=None)
+
+router = APIRouter(tags=["metrics"])
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    def __init__(self):
+        self.in_flight = 0
+        self.latency: Dict[Tuple[str, str], Histogram] = {}
+        self.request_queries: Dict[Tuple[str, str], Histogram] = {}
+        self.request_db_seconds: Dict[Tuple[str, str], Histogram] = {}
+        self.responses: Dict[Tuple[str, str, int], int] = {}
+        self.queries = 0
+        self.query_seconds = 0.0
+
+    def observe_request(self, method: str, route: str, status_code: int, seconds: float, db: List) -> None:
+        key = (method, route)
+        if key not in self.latency:
+            self.latency[key] = Histogram(LATENCY_BUCKETS)
+            self.request_queries[key] = Histogram(QUERY_COUNT_BUCKETS)
+            self.request_db_seconds[key] = Histogram(LATENCY_BUCKETS)
+        self.latency[key].observe(seconds)
+        self.request_queries[key].observe(db[0])
+        self.request_db_seconds[key].observe(db[1])
+        response_key = (method, route, status_code)
+        self.responses[response_key] = self.responses.get(response_key, 0) + 1
+
+    def observe_query(self, seconds: float) -> None:
+        self.queries += 1
+        self.query_seconds += seconds
+        current = _request_db.get()
+        if current is not None:
+            current[0] += 1
+            current[1] += seconds
+
+
+metrics = Metrics()
+
+
+class MetricsMiddleware:
+    """ASGI-middleware: латентність, запити в обробці та коди відповіді за шаблоном маршруту."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        db = [0, 0.0]
+        token = _request_db.set(db)
+        metrics.in_flight += 1
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            metrics.in_flight -= 1
+            _request_db.reset(token)
+            # шаблон маршруту, а не сирий шлях — інакше кожен id стає окремою серією
+            route = scope.get("route")
+            metrics.observe_request(
+                scope["method"],
+                getattr(route, "path", UNMATCHED_ROUTE),
+                status_code,
+                elapsed,
+                db,
+            )
+
+
+def instrument_engine(engine) -> None:
+    """Рахує запити до БД і їхній час через події ``before/after_cursor_execute``."""
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        context._metrics_started = time.perf_counter()
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        metrics.observe_query(time.perf_counter() - context._metrics_started)
+
+    event.listen(engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(engine.sync_engine, "after_cursor_execute", after_cursor_execute)
+
+
+def _labels(**labels) -> str:
+    def escape(value) -> str:
+        return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+    return ",".join(f'{k}="{escape(v)}"' for k, v in labels.items())
+
+
+def _metric(lines: List[str], name: str, kind: str, help_text: str, samples: Iterable[Tuple[str, float]]) -> None:
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} {kind}")
+    for labels, value in samples:
+        lines.append(f"{name}{{{labels}}} {value}" if labels else f"{name} {value}")
+
+
+def _histogram(lines: List[str], name: str, help_text: str, series: Dict[Tuple[str, str], Histogram]) -> None:
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} histogram")
+    for (method, route), hist in series.items():
+        cumulative = 0
+        for bound, count in zip((*hist.buckets, "+Inf"), hist.counts):
+            cumulative += count
+            lines.append(f"{name}_bucket{{{_labels(method=method, route=route, le=bound)}}} {cumulative}")
+        lines.append(f"{name}_sum{{{_labels(method=method, route=route)}}} {hist.sum}")
+        lines.append(f"{name}_count{{{_labels(method=method, route=route)}}} {hist.count}")
+
+
+def render() -> str:
+    lines: List[str] = []
+    _metric(lines, "http_requests_in_flight", "gauge", "Requests currently being served.", [("", metrics.in_flight)])
+    _histogram(lines, "http_request_duration_seconds", "Request latency by route.", metrics.latency)
+    _metric(
+        lines,
+        "http_responses_total",
+        "counter",
+        "Responses by route and status code.",
+        ((_labels(method=m, route=r, status=s), n) for (m, r, s), n in metrics.responses.items()),
+    )
+    _histogram(lines, "http_request_db_queries", "Database queries per request.", metrics.request_queries)
+    _histogram(lines, "http_request_db_seconds", "Database time per request.", metrics.request_db_seconds)
+    _metric(lines, "db_queries_total", "counter", "Database queries executed.", [("", metrics.queries)])
+    _metric(lines, "db_query_seconds_total", "counter", "Time spent in database queries.", [("", metrics.query_seconds)])
+
+    pools = [("primary", database.pool_status())]
+    if database.replica_engine is not None:
+        pools.append(("replica", database.pool_status(database.replica_engine, database.replica_pool_stats)))
+    _metric(
+        lines,
+        "db_pool_checked_out",
+        "gauge",
+        "Connections checked out of the pool.",
+        ((_labels(pool=name), pool.get("checkedout", 0)) for name, pool in pools),
+    )
+    _metric(
+        lines,
+        "db_pool_timeouts_total",
+        "counter",
+        "Pool checkouts that timed out.",
+        ((_labels(pool=name), pool["timeouts"]) for name, pool in pools),
+    )
+
+    cache = user_cache_stats()
+    _metric(
+        lines,
+        "user_cache_requests_total",
+        "counter",
+        "User cache lookups by layer and result.",
+        [
+            (_labels(layer="local", result="hit"), cache["local"]["hits"]),
+            (_labels(layer="local", result="miss"), cache["local"]["misses"]),
+            (_labels(layer="redis", result="hit"), cache["redis"]["hits"]),
+            (_labels(layer="redis", result="miss"), cache["redis"]["misses"]),
+        ],
+    )
+    _metric(lines, "user_cache_local_hit_ratio", "gauge", "Local user cache hit ratio.", [("", cache["local"]["hit_ratio"])])
+
+    tokens = token_cache_stats()
+    _metric(
+        lines,
+        "jwt_cache_requests_total",
+        "counter",
+        "Verified-token cache lookups by result.",
+        [(_labels(result="hit"), tokens["hits"]), (_labels(result="miss"), tokens["misses"])],
+    )
+    revocation = revocation_stats()
+    _metric(
+        lines,
+        "token_revocation_checks_total",
+        "counter",
+        "Revocation checks answered by the Bloom filter or by Redis.",
+        [
+            (_labels(source="filter"), revocation["filter_negatives"]),
+            (_labels(source="redis"), revocation["redis_checks"]),
+        ],
+    )
+
+    hashing = hasher.stats()
+    _metric(lines, "password_hash_operations_total", "counter", "bcrypt hash/verify calls.", [("", hashing["completed"])])
+    _metric(lines, "password_hash_seconds_total", "counter", "Time spent in bcrypt.", [("", hasher.total_seconds)])
+    _metric(lines, "password_hash_rejected_total", "counter", "bcrypt calls rejected as busy.", [("", hashing["rejected"])])
+    _metric(lines, "password_hash_queued", "gauge", "bcrypt calls waiting for a worker.", [("", hashing["queued"])])
+
+    mail = mail_worker.stats()
+    _metric(lines, "mail_sent_total", "counter", "Emails delivered by the outbox worker.", [("", mail["sent"])])
+    _metric(lines, "mail_retries_total", "counter", "Email deliveries scheduled for retry.", [("", mail["retried"])])
+    _metric(lines, "mail_failed_total", "counter", "Emails that exhausted their retries.", [("", mail["failed"])])
+    _metric(
+        lines,
+        "mail_queue_lag_seconds",
+        "gauge",
+        "Age of the oldest email in the last batch taken from the outbox.",
+        [("", mail["lag_seconds"])],
+    )
+
+    limits = rate_limit_stats()
+    _metric(
+        lines,
+        "rate_limit_requests_total",
+        "counter",
+        "Rate limit decisions by rule.",
+        (
+            (_labels(rule=name, result=result), stats[result])
+            for name, stats in limits.items()
+            for result in ("allowed", "rejected")
+        ),
+    )
+    return "\n".join(lines) + "\n"
+
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics_endpoint(request: Request):
+    """
+    Віддає метрики для Prometheus.
+
+    Якщо задано ``METRICS_TOKEN``, scrape має передати його як Bearer-токен.
+
+    :return: Текст у форматі Prometheus exposition.
+    :raises HTTPException: 401 — якщо токен не збігається.
+    """
+    if settings.METRICS_TOKEN and request.headers.get("authorization") != f"Bearer {settings.METRICS_TOKEN}":
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated")
+    return Response(render(), media_type=CONTENT_TYPE)
@@ -1,18 +1,69 @@
 from sqlalchemy import (
     Column,
     Integer,
+    SmallInteger,
+    Boolean,
     String,
     Date,
+    DateTime,
     Text,
     UniqueConstraint,
+    literal,
     ForeignKey,
     Enum,
+    Index,
+    JSON,
+    DDL,
+    event,
+    text,
 )
-from sqlalchemy.orm import relationship
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import relationship, validates
+from sqlalchemy.sql.expression import FunctionElement
 from app.database import Base
+from datetime import date, datetime, timezone
+from typing import Optional
 import enum
 
 
+def birthday_key(d: Optional[date]) -> Optional[int]:
+    """Ключ дня народження ``month * 100 + day`` (наприклад, 229 для 29 лютого)."""
+    return d.month * 100 + d.day if d else None
+
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class db_utcnow(FunctionElement):
+    """
+    Поточний час за годинником БД, з мікросекундами, плюс ``seconds`` зсуву.
+
+    На PostgreSQL — ``clock_timestamp()``: час інструкції, а не початку
+    транзакції, як у ``now()``. Мітки від одного годинника не залежать від
+    розбіжності годинників серверів застосунку.
+    """
+
+    type = DateTime(timezone=True)
+    name = "db_utcnow"
+    inherit_cache = True
+
+    def __init__(self, seconds: float = 0):
+        super().__init__(literal(float(seconds)))
+
+
+@compiles(db_utcnow, "postgresql")
+def _pg_utcnow(element, compiler, **kw):
+    return f"(clock_timestamp() + make_interval(secs => {compiler.process(element.clauses, **kw)}))"
+
+
+@compiles(db_utcnow, "sqlite")
+def _sqlite_utcnow(element, compiler, **kw):
+    # формат, у якому SQLAlchemy зберігає DateTime в SQLite, — інакше порівняння рядків хибне
+    seconds = compiler.process(element.clauses, **kw)
+    return f"strftime('%Y-%m-%d %H:%M:%f000', 'now', {seconds} || ' seconds')"
+
+
 class RoleEnum(str, enum.Enum):
     user = "user"
     admin = "admin"
@@ -27,6 +78,8 @@ class User(Base):
     password_hash = Column(String, nullable=False)
     is_verified = Column(Integer, default=0)
     avatar_url = Column(String, nullable=True)
+    # sha256 завантаженого аватара (ключ ``avatar_blobs``); None для аватара за замовчуванням
+    avatar_hash = Column(String(64), nullable=True)
     role = Column(Enum(RoleEnum, name="roleenum"), default=RoleEnum.user, nullable=False)
 
     contacts = relationship(
@@ -38,15 +91,50 @@ class User(Base):
 
 class Contact(Base):
     __tablename__ = "contacts"
-    __table_args__ = (UniqueConstraint("email", name="uq_contacts_email"),)
+    __table_args__ = (
+        # надгробки (deleted_at IS NOT NULL) не займають email
+        Index(
+            "uq_contacts_email",
+            "email",
+            unique=True,
+            postgresql_where=text("deleted_at IS NULL"),
+            sqlite_where=text("deleted_at IS NULL"),
+        ),
+        Index(
+            "uq_contacts_name",
+            "name",
+            "last_name",
+            unique=True,
+            postgresql_where=text("deleted_at IS NULL"),
+            sqlite_where=text("deleted_at IS NULL"),
+        ),
+        Index("ix_contacts_owner_id_id", "owner_id", "id"),
+        Index("ix_contacts_owner_id_birthday_md", "owner_id", "birthday_md"),
+        Index("ix_contacts_owner_id_updated_at", "owner_id", "updated_at"),
+        *(
+            Index(
+                f"ix_contacts_{column}_trgm",
+                column,
+                postgresql_using="gin",
+                postgresql_ops={column: "gin_trgm_ops"},
+            ).ddl_if(dialect="postgresql")
+            for column in ("name", "last_name", "email")
+        ),
+    )
+    # updated_at рахує БД — забираємо його RETURNING, а не лінивим SELECT
+    __mapper_args__ = {"eager_defaults": True}
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True, nullable=False)
     last_name = Column(String, index=True, nullable=False)
-    email = Column(String, unique=True, index=True, nullable=False)
+    email = Column(String, index=True, nullable=False)
     phone = Column(String, index=True, nullable=False)
     birthday = Column(Date, nullable=True)
+    birthday_md = Column(SmallInteger, nullable=True)
     extra = Column(Text, nullable=True)
+    # час БД, а не застосунку: за ним рахується водяний знак /contacts/changes
+    updated_at = Column(DateTime(timezone=True), default=db_utcnow(), onupdate=db_utcnow(), nullable=False)
+    deleted_at = Column(DateTime(timezone=True), nullable=True)
 
     owner_id = Column(
         Integer,
@@ -54,3 +142,60 @@ class Contact(Base):
         nullable=False,
     )
     owner = relationship("User", back_populates="contacts")
+
+    @validates("birthday")
+    def _sync_birthday_md(self, key, value):
+        self.birthday_md = birthday_key(value)
+        return value
+
+
+class JobCheckpoint(Base):
+    """Прогрес пакетної задачі за конкретну дату запуску (для відновлення після збою)."""
+
+    __tablename__ = "job_checkpoints"
+
+    job = Column(String, primary_key=True)
+    run_date = Column(Date, primary_key=True)
+    last_user_id = Column(Integer, nullable=False, default=0)
+    completed = Column(Boolean, nullable=False, default=False)
+
+
+class AvatarBlob(Base):
+    """Збережений аватар, адресований sha256 вмісту, з URL кожного розміру."""
+
+    __tablename__ = "avatar_blobs"
+
+    digest = Column(String(64), primary_key=True)
+    content_type = Column(String, nullable=False)
+    # {"256": url, "64": url, ...}
+    variants = Column(JSON, nullable=False)
+    created_at = Column(DateTime(timezone=True), nullable=False, default=utcnow)
+
+
+class OutboxMessage(Base):
+    """Лист у черзі на надсилання (transactional outbox, див. ``app.outbox``)."""
+
+    __tablename__ = "mail_outbox"
+    __table_args__ = (
+        # воркер вибирає pending-листи, час яких настав
+        Index("ix_mail_outbox_status_next_attempt_at", "status", "next_attempt_at"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    recipient = Column(String, nullable=False)
+    subject = Column(String, nullable=False)
+    body = Column(Text, nullable=False)
+    status = Column(String, nullable=False, default="pending")
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime(timezone=True), nullable=False, default=utcnow)
+    created_at = Column(DateTime(timezone=True), nullable=False, default=utcnow)
+    sent_at = Column(DateTime(timezone=True), nullable=True)
+    last_error = Column(String, nullable=True)
+
+
+# GIN trigram indexes above need the extension before the tables are created
+event.listen(
+    Base.metadata,
+    "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql"),
+)
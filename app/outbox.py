@@ -0,0 +1,288 @@
+"""
+Черга вихідної пошти (transactional outbox).
+
+Маршрути не надсилають листи самі: :func:`enqueue` додає рядок у
+``mail_outbox`` в тій самій транзакції, що й зміни, які лист описує, тож
+лист не губиться при падінні воркера і не надсилається для відкоченої
+транзакції. Окремий воркер вибирає пакети pending-листів, бере їх в оренду
+на ``MAIL_OUTBOX_LEASE_SECONDS`` і надсилає через пул постійних
+SMTP-з'єднань. Невдалі листи повторюються з експоненційною затримкою, після
+``MAIL_MAX_ATTEMPTS`` спроб позначаються ``failed``. Доставка — щонайменше
+один раз: лист, оренда якого спливла до підтвердження, буде надіслано повторно.
+
+Запуск воркера::
+
+    python -m app.outbox
+"""
+import argparse
+import asyncio
+import logging
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from email.message import EmailMessage
+from typing import List, Optional, Tuple
+
+import aiosmtplib
+from fastapi_mail import MessageSchema
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app import models
+from app.config import settings
+from app.database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+SENT = "sent"
+FAILED = "failed"
+
+
+def enqueue(db: AsyncSession, recipient: str, subject: str, body: str) -> None:
+    """
+    Додає лист до черги; запис стане видимим воркеру після коміту ``db``.
+
+    :param db: Сесія, в транзакції якої лист має з'явитися.
+    :param recipient: Адреса одержувача.
+    :param subject: Тема листа.
+    :param body: Текст листа.
+    """
+    db.add(models.OutboxMessage(recipient=recipient, subject=subject, body=body))
+
+
+def enqueue_message(db: AsyncSession, message: MessageSchema) -> None:
+    """Ставить у чергу ``MessageSchema`` — по листу на кожного одержувача."""
+    for recipient in message.recipients:
+        enqueue(db, getattr(recipient, "email", recipient), message.subject, message.body)
+
+
+class OutboxMailer:
+    """Адаптер з інтерфейсом ``FastMail.send_message``, що кладе лист у чергу."""
+
+    def __init__(self, session_factory: async_sessionmaker = SessionLocal):
+        self.session_factory = session_factory
+
+    async def send_message(self, message: MessageSchema) -> None:
+        async with self.session_factory() as db:
+            enqueue_message(db, message)
+            await db.commit()
+
+
+class SmtpPool:
+    """Пул постійних SMTP-з'єднань; з'єднання, що впало, відкривається заново."""
+
+    def __init__(self, size: int):
+        self.size = size
+        self._idle: asyncio.Queue = asyncio.Queue()
+        self._created = 0
+
+    def _client(self) -> aiosmtplib.SMTP:
+        return aiosmtplib.SMTP(
+            hostname=settings.SMTP_HOST,
+            port=settings.SMTP_PORT,
+            username=settings.SMTP_USER or None,
+            password=settings.SMTP_PASSWORD or None,
+            start_tls=False,
+            timeout=30,
+        )
+
+    async def _acquire(self) -> aiosmtplib.SMTP:
+        if self._idle.empty() and self._created < self.size:
+            self._created += 1
+            return self._client()
+        return await self._idle.get()
+
+    async def send(self, message: EmailMessage) -> None:
+        client = await self._acquire()
+        try:
+            if not client.is_connected:
+                await client.connect()
+            await client.send_message(message)
+        except (aiosmtplib.SMTPException, OSError):
+            client.close()
+            raise
+        finally:
+            self._idle.put_nowait(client)
+
+    async def close(self) -> None:
+        while not self._idle.empty():
+            client = self._idle.get_nowait()
+            if client.is_connected:
+                try:
+                    await client.quit()
+                except (aiosmtplib.SMTPException, OSError):
+                    client.close()
+        self._created = 0
+
+
+def _aware(value: datetime) -> datetime:
+    # SQLite повертає naive datetime
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def retry_delay(attempts: int) -> float:
+    """Експоненційна затримка з jitter після ``attempts`` невдалих спроб."""
+    delay = min(settings.MAIL_RETRY_MAX_SECONDS, settings.MAIL_RETRY_BASE_SECONDS * 2 ** (attempts - 1))
+    return delay * random.uniform(0.5, 1.0)
+
+
+class OutboxWorker:
+    def __init__(self, session_factory: async_sessionmaker = SessionLocal, transport=None):
+        self.session_factory = session_factory
+        self.transport = transport or SmtpPool(settings.MAIL_SMTP_CONNECTIONS)
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+        self.batches = 0
+        self.send_seconds = 0.0
+        self.lag_seconds = 0.0
+
+    async def _claim(self) -> List[Tuple]:
+        now = datetime.now(timezone.utc)
+        async with self.session_factory() as db:
+            messages = (await db.scalars(
+                select(models.OutboxMessage)
+                .where(models.OutboxMessage.status == PENDING, models.OutboxMessage.next_attempt_at <= now)
+                .order_by(models.OutboxMessage.next_attempt_at, models.OutboxMessage.id)
+                .limit(settings.MAIL_OUTBOX_BATCH_SIZE)
+                .with_for_update(skip_locked=True)
+            )).all()
+            claimed = [(m.id, m.recipient, m.subject, m.body, m.attempts, _aware(m.created_at)) for m in messages]
+            lease = now + timedelta(seconds=settings.MAIL_OUTBOX_LEASE_SECONDS)
+            for m in messages:
+                m.next_attempt_at = lease
+            await db.commit()
+        if claimed:
+            self.lag_seconds = (now - min(c[5] for c in claimed)).total_seconds()
+        return claimed
+
+    async def _deliver(self, item: Tuple) -> Optional[str]:
+        _, recipient, subject, body, _, _ = item
+        message = EmailMessage()
+        message["From"] = settings.SMTP_FROM
+        message["To"] = recipient
+        message["Subject"] = subject
+        message.set_content(body)
+        try:
+            await self.transport.send(message)
+        except Exception as e:
+            return f"{type(e).__name__}: {e}"
+        return None
+
+    async def drain_once(self) -> int:
+        """
+        Надсилає один пакет листів.
+
+        :return: Кількість опрацьованих листів (0 — черга порожня).
+        """
+        claimed = await self._claim()
+        if not claimed:
+            return 0
+
+        started = time.perf_counter()
+        errors = await asyncio.gather(*(self._deliver(item) for item in claimed))
+        self.send_seconds += time.perf_counter() - started
+        self.batches += 1
+
+        now = datetime.now(timezone.utc)
+        sent_ids = [item[0] for item, error in zip(claimed, errors) if error is None]
+        async with self.session_factory() as db:
+            if sent_ids:
+                await db.execute(
+                    update(models.OutboxMessage)
+                    .where(models.OutboxMessage.id.in_(sent_ids))
+                    .values(status=SENT, sent_at=now, attempts=models.OutboxMessage.attempts + 1, last_error=None)
+                    .execution_options(synchronize_session=False)
+                )
+            for item, error in zip(claimed, errors):
+                if error is None:
+                    continue
+                attempts = item[4] + 1
+                values = {"attempts": attempts, "last_error": error[:500]}
+                if attempts >= settings.MAIL_MAX_ATTEMPTS:
+                    values["status"] = FAILED
+                    self.failed += 1
+                    logger.error("mail %s to %s failed permanently: %s", item[0], item[1], error)
+                else:
+                    values["next_attempt_at"] = now + timedelta(seconds=retry_delay(attempts))
+                    self.retried += 1
+                await db.execute(
+                    update(models.OutboxMessage)
+                    .where(models.OutboxMessage.id == item[0])
+                    .values(**values)
+                    .execution_options(synchronize_session=False)
+                )
+            await db.commit()
+        self.sent += len(sent_ids)
+        return len(claimed)
+
+    async def run(self) -> None:
+        """Обробляє чергу, поки задачу не скасують; між порожніми проходами чекає."""
+        try:
+            while True:
+                try:
+                    if await self.drain_once():
+                        continue
+                except Exception:
+                    logger.exception("mail outbox pass failed")
+                await asyncio.sleep(settings.MAIL_OUTBOX_POLL_INTERVAL)
+        finally:
+            if isinstance(self.transport, SmtpPool):
+                await self.transport.close()
+
+    def stats(self) -> dict:
+        return {
+            "sent": self.sent,
+            "retried": self.retried,
+            "failed": self.failed,
+            "batches": self.batches,
+            "messages_per_second": round(self.sent / self.send_seconds, 1) if self.send_seconds else 0.0,
+            "lag_seconds": self.lag_seconds,
+        }
+
+
+worker = OutboxWorker()
+
+
+async def queue_status(db: AsyncSession) -> dict:
+    """Глибина черги і вік найстарішого pending-листа (для моніторингу з будь-якого процесу)."""
+    pending, oldest = (await db.execute(
+        select(func.count(), func.min(models.OutboxMessage.created_at))
+        .select_from(models.OutboxMessage)
+        .where(models.OutboxMessage.status == PENDING)
+    )).one()
+    failed = await db.scalar(
+        select(func.count()).select_from(models.OutboxMessage).where(models.OutboxMessage.status == FAILED)
+    )
+    lag = (datetime.now(timezone.utc) - _aware(oldest)).total_seconds() if oldest else 0.0
+    return {"pending": pending, "failed": failed, "oldest_pending_seconds": round(lag, 3)}
+
+
+async def drain() -> int:
+    """Надсилає все, що вже готове до надсилання, і закриває SMTP-з'єднання."""
+    total = 0
+    try:
+        while processed := await worker.drain_once():
+            total += processed
+    finally:
+        if isinstance(worker.transport, SmtpPool):
+            await worker.transport.close()
+    return total
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Deliver queued outbound mail.")
+    parser.add_argument("--once", action="store_true", help="drain the ready messages and exit")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.once:
+        asyncio.run(drain())
+        print(worker.stats())
+    else:
+        asyncio.run(worker.run())
+
+
+if __name__ == "__main__":
+    main()
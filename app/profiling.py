@@ -0,0 +1,149 @@
+"""
+Профілювання SQL: журнал запитів на HTTP-запит, N+1 і повільні запити.
+
+Вмикається ``DB_PROFILE=true``: події рушія записують кожен оператор з
+тривалістю та нормалізованим «відбитком» (літерали й параметри замінені на
+``?``), а middleware наприкінці запиту попереджає, якщо операторів більше за
+``DB_PROFILE_MAX_STATEMENTS`` або один відбиток повторюється
+``DB_PROFILE_REPEAT_THRESHOLD`` разів (типовий N+1). Оператори, повільніші за
+``DB_SLOW_QUERY_MS``, логуються разом з планом ``EXPLAIN``.
+
+Тести можуть перевіряти бюджет запитів через :func:`capture_queries`.
+"""
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, List, Optional, Tuple
+
+from sqlalchemy import event
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+_FINGERPRINT_RULES = (
+    (re.compile(r"'(?:[^']|'')*'"), "?"),
+    (re.compile(r"%\(\w+\)s|\$\d+|(?<!:):\w+|\?"), "?"),
+    (re.compile(r"\b\d+(?:\.\d+)?\b"), "?"),
+    (re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)"), "(?)"),
+    (re.compile(r"(?:\(\?\)\s*,\s*)+\(\?\)"), "(?)"),
+    (re.compile(r"\s+"), " "),
+)
+
+_current: ContextVar[Optional["QueryLog"]] = ContextVar("query_log", default=None)
+_captures: List[List["QueryLog"]] = []
+
+
+def fingerprint(statement: str) -> str:
+    """Нормалізує SQL: однакові за формою запити дають однаковий відбиток."""
+    for pattern, replacement in _FINGERPRINT_RULES:
+        statement = pattern.sub(replacement, statement)
+    return statement.strip()
+
+
+class QueryLog:
+    """Оператори SQL одного HTTP-запиту."""
+
+    def __init__(self, method: str = "", path: str = ""):
+        self.method = method
+        self.path = path
+        self.statements: List[Tuple[str, str, float]] = []
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    @property
+    def seconds(self) -> float:
+        return sum(s for _, _, s in self.statements)
+
+    def repeated(self, threshold: int) -> List[Tuple[str, int]]:
+        counts = Counter(fp for fp, _, _ in self.statements)
+        return [(fp, n) for fp, n in counts.most_common() if n >= threshold]
+
+    def report(self) -> str:
+        lines = [f"{self.method} {self.path}: {self.count} statements, {self.seconds * 1000:.1f} ms"]
+        for fp, n in Counter(fp for fp, _, _ in self.statements).most_common():
+            lines.append(f"  {n} x {fp}")
+        return "\n".join(lines)
+
+
+def _explain(conn, statement: str, parameters) -> Optional[str]:
+    if not statement.lstrip().upper().startswith("SELECT"):
+        return None
+    prefix = "EXPLAIN QUERY PLAN " if conn.dialect.name == "sqlite" else "EXPLAIN "
+    cursor = conn.connection.cursor()
+    try:
+        cursor.execute(prefix + statement, parameters)
+        return "\n".join(" ".join(str(col) for col in row) for row in cursor.fetchall())
+    except Exception as e:
+        return f"EXPLAIN failed: {e}"
+    finally:
+        cursor.close()
+
+
+def instrument(engine) -> None:
+    """Підключає профілювання до ``AsyncEngine``."""
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        context._profile_started = time.perf_counter()
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - context._profile_started
+        log = _current.get()
+        if log is not None:
+            log.statements.append((fingerprint(statement), statement, elapsed))
+        if elapsed * 1000 >= settings.DB_SLOW_QUERY_MS:
+            plan = _explain(conn, statement, parameters) if settings.DB_EXPLAIN_SLOW and not executemany else None
+            logger.warning("slow query (%.1f ms): %s%s", elapsed * 1000, statement, f"\n{plan}" if plan else "")
+
+    event.listen(engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(engine.sync_engine, "after_cursor_execute", after_cursor_execute)
+
+
+class QueryProfileMiddleware:
+    """ASGI-middleware, що збирає ``QueryLog`` на кожен HTTP-запит."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        log = QueryLog(scope["method"], scope["path"])
+        token = _current.set(log)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _current.reset(token)
+            _finish(log)
+
+
+def _finish(log: QueryLog) -> None:
+    if log.count > settings.DB_PROFILE_MAX_STATEMENTS:
+        logger.warning("too many statements\n%s", log.report())
+    for fp, n in log.repeated(settings.DB_PROFILE_REPEAT_THRESHOLD):
+        logger.warning("possible N+1 in %s %s: %d x %s", log.method, log.path, n, fp)
+    for capture in _captures:
+        capture.append(log)
+
+
+@contextmanager
+def capture_queries() -> Iterator[List[QueryLog]]:
+    """
+    Збирає ``QueryLog`` усіх HTTP-запитів, завершених усередині блоку.
+
+    Працює крізь потоки (TestClient обслуговує запити в іншому потоці),
+    тому реєстрація глобальна, а не через contextvar.
+    """
+    logs: List[QueryLog] = []
+    _captures.append(logs)
+    try:
+        yield logs
+    finally:
+        _captures.remove(logs)
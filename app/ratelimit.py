@@ -0,0 +1,191 @@
+"""
+Обмеження частоти запитів.
+
+Кожне правило — token bucket на ключ (IP, користувач, логін). Рішення
+приймається в процесі, без звернення до Redis; раз на
+``RATE_LIMIT_SYNC_INTERVAL`` секунд спожиті токени списуються зі спільного
+bucket у Redis одним Lua-скриптом, і локальний bucket вирівнюється за ним,
+тож ліміт діє на весь кластер воркерів.
+
+Якщо Redis недоступний, політика ``RATE_LIMIT_FAIL_OPEN`` вирішує: або
+лишаються тільки локальні (на процес) ліміти, або запити відхиляються з 503.
+Стан Redis спільний для всіх правил процесу: після помилки синхронізації
+Redis вважається недоступним на ``RATE_LIMIT_SYNC_INTERVAL``, і політика
+однаково застосовується до всіх ключів, потім наступна синхронізація його
+перевіряє знову.
+"""
+import math
+import time
+from typing import Callable, Dict
+
+from fastapi import Depends, HTTPException, Request, status
+from fastapi.security import OAuth2PasswordRequestForm
+from redis.exceptions import RedisError
+
+from app.cache import LocalLRU, get_redis
+from app.config import settings
+
+RATE_LIMIT_PREFIX = "ratelimit:"
+
+# повертає залишок токенів після списання ARGV[4] спожитих
+_TAKE_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local taken = tonumber(ARGV[4])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+tokens = math.max(-capacity, tokens - taken)
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 2000))
+return tostring(tokens)
+"""
+
+_limits: Dict[str, "RateLimit"] = {}
+# time.monotonic(), до якого Redis вважається недоступним
+_redis_retry_at = 0.0
+
+
+class TokenBucket:
+    __slots__ = ("tokens", "updated", "pending", "synced")
+
+    def __init__(self, capacity: float, now: float):
+        self.tokens = capacity
+        self.updated = now
+        self.pending = 0
+        self.synced = -math.inf
+
+    def refill(self, now: float, capacity: float, rate: float) -> None:
+        self.tokens = min(capacity, self.tokens + (now - self.updated) * rate)
+        self.updated = now
+
+
+class RateLimit:
+    """
+    Правило ``times`` запитів за ``seconds`` секунд на ключ.
+
+    Значення можна перевизначити через ``settings.RATE_LIMITS``
+    (``{"auth.login": "5/60"}``) без зміни коду.
+    """
+
+    def __init__(self, name: str, times: int, seconds: float):
+        override = settings.RATE_LIMITS.get(name)
+        if override:
+            times, seconds = override.split("/")
+        self.name = name
+        self.capacity = float(times)
+        self.rate = float(times) / float(seconds)
+        # через ``seconds`` простою bucket і так повний — його можна забути
+        self._buckets = LocalLRU(settings.RATE_LIMIT_MAX_KEYS, float(seconds))
+        self.allowed = 0
+        self.rejected = 0
+        self.syncs = 0
+        self.sync_errors = 0
+
+    @staticmethod
+    def _unavailable() -> HTTPException:
+        return HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Rate limiter unavailable",
+            headers={"Retry-After": "1"},
+        )
+
+    async def hit(self, key: str) -> None:
+        now = time.monotonic()
+        redis_down = now < _redis_retry_at
+        if redis_down and not settings.RATE_LIMIT_FAIL_OPEN:
+            self.rejected += 1
+            raise self._unavailable()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(self.capacity, now)
+        bucket.refill(now, self.capacity, self.rate)
+        if not redis_down and now - bucket.synced >= settings.RATE_LIMIT_SYNC_INTERVAL:
+            await self._sync(key, bucket, now)
+
+        if bucket.tokens < 1:
+            self._buckets.set(key, bucket)
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many requests",
+                headers={"Retry-After": str(math.ceil((1 - bucket.tokens) / self.rate))},
+            )
+        bucket.tokens -= 1
+        bucket.pending += 1
+        self._buckets.set(key, bucket)
+        self.allowed += 1
+
+    async def _sync(self, key: str, bucket: TokenBucket, now: float) -> None:
+        global _redis_retry_at
+        taken, bucket.pending = bucket.pending, 0
+        try:
+            r = await get_redis()
+            remaining = float(await r.eval(
+                _TAKE_SCRIPT,
+                1,
+                f"{RATE_LIMIT_PREFIX}{self.name}:{key}",
+                self.capacity,
+                self.rate,
+                time.time(),
+                taken,
+            ))
+        except (RedisError, OSError):
+            bucket.pending += taken
+            self._buckets.set(key, bucket)
+            self.sync_errors += 1
+            _redis_retry_at = now + settings.RATE_LIMIT_SYNC_INTERVAL
+            if not settings.RATE_LIMIT_FAIL_OPEN:
+                self.rejected += 1
+                raise self._unavailable()
+            return
+        # synced лише після успіху: bucket, що не синхронізувався, спробує знову
+        bucket.synced = now
+        self.syncs += 1
+        # запити, що пройшли локально під час await, у Redis ще не враховані
+        bucket.tokens = min(self.capacity, remaining) - bucket.pending
+
+    def stats(self) -> dict:
+        return {
+            "capacity": self.capacity,
+            "per_second": self.rate,
+            "allowed": self.allowed,
+            "rejected": self.rejected,
+            "syncs": self.syncs,
+            "sync_errors": self.sync_errors,
+            "redis_available": time.monotonic() >= _redis_retry_at,
+            "keys": self._buckets.stats()["size"],
+        }
+
+
+def client_ip(request: Request) -> str:
+    return f"ip:{request.client.host if request.client else 'unknown'}"
+
+
+def login_username(form: OAuth2PasswordRequestForm = Depends()) -> str:
+    return f"login:{form.username.lower()}"
+
+
+def rate_limit(name: str, times: int, seconds: float, key: Callable = client_ip) -> Callable:
+    """
+    Створює залежність FastAPI, що застосовує правило ``name`` до ключа ``key``.
+
+    :param name: Ім'я правила (ключ у ``settings.RATE_LIMITS`` і в Redis).
+    :param times: Кількість запитів за вікно (ємність bucket).
+    :param seconds: Розмір вікна в секундах.
+    :param key: Залежність, що повертає ключ обмеження (IP, користувач тощо).
+    :return: Залежність для ``Depends``.
+    :raises HTTPException: 429 — ліміт вичерпано; 503 — Redis недоступний і політика fail-closed.
+    """
+    limit = _limits[name] = RateLimit(name, times, seconds)
+
+    async def dependency(identity: str = Depends(key)):
+        await limit.hit(identity)
+
+    return dependency
+
+
+def rate_limit_stats() -> dict:
+    return {name: limit.stats() for name, limit in _limits.items()}
@@ -0,0 +1,196 @@
+"""
+Відкликання JWT.
+
+Два механізми в Redis:
+
+* ``revoked:user:<id>`` — епоха користувача: усі його токени з ``iat``
+  раніше за неї недійсні (скидання пароля, зміна ролі);
+* ``revoked:jti:<jti>`` — окремий токен (вихід із системи), живе до ``exp``.
+
+Кожне відкликання також пишеться в журнал ``revoked:log`` (sorted set за
+часом). Процес тримає Bloom-фільтр відкликаних ``jti`` та користувачів і
+раз на ``TOKEN_REVOCATION_SYNC_INTERVAL`` секунд дочитує з журналу лише нові
+записи. Якщо фільтр каже «немає» — токен не відкликано і Redis не
+запитується; лише можливий збіг перевіряється в Redis. Відкликання в інших
+процесах стає видимим із затримкою не більшою за інтервал синхронізації.
+"""
+import hashlib
+import logging
+import math
+import time
+from typing import Optional
+
+from fastapi import HTTPException, status
+from redis.exceptions import RedisError
+
+from app.cache import get_redis
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+REVOCATION_PREFIX = "revoked:"
+REVOCATION_LOG = f"{REVOCATION_PREFIX}log"
+# запас на розбіжність годинників між процесами під час дочитування журналу
+CLOCK_SKEW = 5.0
+
+
+class BloomFilter:
+    """Bloom-фільтр на ``bytearray`` з подвійним хешуванням blake2b."""
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.capacity = capacity
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, item: str) -> None:
+        for pos in self._positions(item):
+            self._bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(self._bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+
+class RevocationList:
+    def __init__(self):
+        self._filter = self._new_filter()
+        self._built = -math.inf
+        self._synced = -math.inf
+        # час (time.time) останнього прочитаного запису журналу
+        self._cursor = 0.0
+        self.filter_negatives = 0
+        self.redis_checks = 0
+        self.revoked = 0
+        self.sync_errors = 0
+
+    @staticmethod
+    def _new_filter() -> BloomFilter:
+        return BloomFilter(settings.TOKEN_REVOCATION_BLOOM_CAPACITY, settings.TOKEN_REVOCATION_BLOOM_ERROR_RATE)
+
+    async def _sync(self, now: float) -> None:
+        self._synced = now
+        # журнал обрізається за TTL, тож повна перебудова позбавляє фільтр застарілих записів
+        rebuild = now - self._built >= settings.TOKEN_REVOCATION_TTL or self._filter.count >= self._filter.capacity
+        start = "-inf" if rebuild else self._cursor - CLOCK_SKEW
+        try:
+            r = await get_redis()
+            entries = await r.zrangebyscore(REVOCATION_LOG, start, "+inf", withscores=True)
+        except (RedisError, OSError):
+            self.sync_errors += 1
+            return
+        if rebuild:
+            self._filter = self._new_filter()
+            self._built = now
+        for member, score in entries:
+            self._filter.add(member)
+            self._cursor = max(self._cursor, score)
+
+    async def _log(self, member: str, key: str, value: str, ttl: int) -> None:
+        self._filter.add(member)
+        now = time.time()
+        try:
+            r = await get_redis()
+            async with r.pipeline(transaction=True) as pipe:
+                pipe.set(key, value, ex=max(1, ttl))
+                pipe.zadd(REVOCATION_LOG, {member: now})
+                pipe.zremrangebyscore(REVOCATION_LOG, "-inf", now - settings.TOKEN_REVOCATION_TTL)
+                await pipe.execute()
+        except (RedisError, OSError):
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Token revocation unavailable",
+                headers={"Retry-After": "1"},
+            )
+        self.revoked += 1
+
+    async def revoke_token(self, claims: dict) -> None:
+        jti = claims.get("jti")
+        if not jti:
+            return
+        ttl = settings.TOKEN_REVOCATION_TTL
+        if isinstance(claims.get("exp"), (int, float)):
+            ttl = math.ceil(claims["exp"] - time.time())
+            if ttl <= 0:
+                return
+        await self._log(f"jti:{jti}", f"{REVOCATION_PREFIX}jti:{jti}", "1", ttl)
+
+    async def revoke_user(self, user_id: int) -> None:
+        await self._log(
+            f"user:{user_id}",
+            f"{REVOCATION_PREFIX}user:{user_id}",
+            repr(time.time()),
+            settings.TOKEN_REVOCATION_TTL,
+        )
+
+    async def is_revoked(self, claims: dict) -> bool:
+        now = time.monotonic()
+        if now - self._synced >= settings.TOKEN_REVOCATION_SYNC_INTERVAL:
+            await self._sync(now)
+
+        jti: Optional[str] = claims.get("jti")
+        user = f"user:{claims.get('sub')}"
+        if user not in self._filter and not (jti and f"jti:{jti}" in self._filter):
+            self.filter_negatives += 1
+            return False
+
+        self.redis_checks += 1
+        keys = [f"{REVOCATION_PREFIX}{user}"] + ([f"{REVOCATION_PREFIX}jti:{jti}"] if jti else [])
+        try:
+            r = await get_redis()
+            epoch, *denied = await r.mget(keys)
+        except (RedisError, OSError):
+            # можливий збіг, який неможливо перевірити, вважаємо відкликанням
+            logger.warning("revocation check failed, rejecting token of %s", user)
+            return True
+        if any(denied):
+            return True
+        return epoch is not None and float(claims.get("iat") or 0) < float(epoch)
+
+    def stats(self) -> dict:
+        return {
+            "filter_entries": self._filter.count,
+            "filter_capacity": self._filter.capacity,
+            "filter_negatives": self.filter_negatives,
+            "redis_checks": self.redis_checks,
+            "revoked": self.revoked,
+            "sync_errors": self.sync_errors,
+        }
+
+
+revocations = RevocationList()
+
+
+async def revoke_token(claims: dict) -> None:
+    """
+    Відкликає один токен за його ``jti`` до моменту ``exp``.
+
+    :param claims: Перевірені claims токена.
+    :raises HTTPException: 503 — Redis недоступний, відкликання не записано.
+    """
+    await revocations.revoke_token(claims)
+
+
+async def revoke_user_tokens(user_id: int) -> None:
+    """
+    Відкликає всі токени користувача, видані до цього моменту.
+
+    :param user_id: Ідентифікатор користувача.
+    :raises HTTPException: 503 — Redis недоступний, відкликання не записано.
+    """
+    await revocations.revoke_user(user_id)
+
+
+async def is_revoked(claims: dict) -> bool:
+    return await revocations.is_revoked(claims)
+
+
+def revocation_stats() -> dict:
+    return revocations.stats()
@@ -1,6 +1,6 @@
 from pydantic import BaseModel, EmailStr
 from datetime import date
-from typing import Optional, Literal
+from typing import List, Optional, Literal
 
 
 class UserCreate(BaseModel):
@@ -59,6 +59,29 @@ class Contact(BaseModel):
         from_attributes = True
 
 
+class BulkRowResult(BaseModel):
+    index: int
+    status: Literal["created", "duplicate", "invalid"]
+    id: Optional[int] = None
+    detail: Optional[str] = None
+
+
+class BulkImportResult(BaseModel):
+    created: int
+    duplicates: int
+    invalid: int
+    results: List[BulkRowResult]
+    # причина, з якої імпорт зупинився посеред тіла
+    detail: Optional[str] = None
+
+
+class ContactChanges(BaseModel):
+    updated: List[Contact]
+    deleted: List[int]
+    since: str
+    has_more: bool
+
+
 class ResetRequest(BaseModel):
     email: EmailStr
 
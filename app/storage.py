@@ -0,0 +1,56 @@
+"""
+Сховища аватарів.
+
+Бекенд обирається ``settings.AVATAR_STORAGE``: ``cloudinary`` (типово) або
+``local`` — файли на диску в ``AVATAR_LOCAL_DIR``, що роздаються застосунком
+за ``AVATAR_LOCAL_URL`` (для розробки й тестів без мережі). Метод ``save``
+блокуючий — викликайте його в пулі потоків.
+"""
+import mimetypes
+import os
+import tempfile
+from io import BytesIO
+
+import cloudinary.uploader as cu
+
+from app.config import settings
+
+AVATAR_FOLDER = "avatars"
+
+
+class CloudinaryStorage:
+    name = "cloudinary"
+
+    def save(self, name: str, data: bytes, content_type: str) -> str:
+        res = cu.upload(BytesIO(data), folder=AVATAR_FOLDER, public_id=name, overwrite=True)
+        return res["secure_url"]
+
+
+class LocalStorage:
+    name = "local"
+
+    def __init__(self, root: str = None, base_url: str = None):
+        self.root = root or settings.AVATAR_LOCAL_DIR
+        self.base_url = (base_url or settings.AVATAR_LOCAL_URL).rstrip("/")
+
+    def save(self, name: str, data: bytes, content_type: str) -> str:
+        filename = f"{name}{mimetypes.guess_extension(content_type) or ''}"
+        directory = os.path.dirname(os.path.join(self.root, AVATAR_FOLDER, filename))
+        os.makedirs(directory, exist_ok=True)
+        # запис у тимчасовий файл і атомарна заміна: читач не побачить половину файлу
+        fd, tmp = tempfile.mkstemp(dir=directory)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, os.path.join(self.root, AVATAR_FOLDER, filename))
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        # імена адресуються sha256 вмісту (див. app.avatars) і не перезаписуються
+        # іншими даними, тож URL можна кешувати без параметра версії
+        return f"{self.base_url}/{AVATAR_FOLDER}/{filename}"
+
+
+BACKENDS = {"cloudinary": CloudinaryStorage, "local": LocalStorage}
+
+backend = BACKENDS[settings.AVATAR_STORAGE]()
@@ -0,0 +1,134 @@
+"""
+Кодування та перевірка JWT.
+
+Реалізація JOSE змінна (``settings.JWT_BACKEND``): ``jose`` — python-jose,
+``hmac`` — мінімальна реалізація HS256/384/512 на stdlib. Перевірені claims
+кешуються в процесі за SHA-256 токена до його ``exp`` (не довше за
+``JWT_CACHE_MAX_TTL``), тож клієнт, що повторно надсилає той самий токен,
+не платить за розбір і перевірку підпису щоразу.
+"""
+import base64
+import binascii
+import hashlib
+import hmac
+import json
+import time
+from datetime import datetime
+from typing import Any, Dict, List
+
+from app.cache import LocalLRU
+from app.config import settings
+
+
+class TokenError(Exception):
+    """Токен недійсний або прострочений."""
+
+
+class JoseBackend:
+    name = "jose"
+
+    def encode(self, claims: Dict[str, Any], key: str, algorithm: str) -> str:
+        from jose import jwt
+
+        return jwt.encode(claims, key, algorithm=algorithm)
+
+    def decode(self, token: str, key: str, algorithms: List[str]) -> Dict[str, Any]:
+        from jose import JWTError, jwt
+
+        try:
+            return jwt.decode(token, key, algorithms=algorithms)
+        except JWTError as e:
+            raise TokenError(str(e)) from e
+
+
+class HmacBackend:
+    """HMAC-підпис (HS256/384/512) і перевірка ``exp``/``nbf`` без сторонніх бібліотек."""
+
+    name = "hmac"
+    DIGESTS = {"HS256": hashlib.sha256, "HS384": hashlib.sha384, "HS512": hashlib.sha512}
+
+    @staticmethod
+    def _b64encode(data: bytes) -> bytes:
+        return base64.urlsafe_b64encode(data).rstrip(b"=")
+
+    @staticmethod
+    def _b64decode(data: str) -> bytes:
+        return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+    def _sign(self, signing_input: bytes, key: str, algorithm: str) -> bytes:
+        return hmac.new(key.encode(), signing_input, self.DIGESTS[algorithm]).digest()
+
+    def encode(self, claims: Dict[str, Any], key: str, algorithm: str) -> str:
+        if algorithm not in self.DIGESTS:
+            raise TokenError(f"Unsupported algorithm {algorithm}")
+        claims = {
+            k: int(v.timestamp()) if isinstance(v, datetime) and k in ("exp", "iat", "nbf") else v
+            for k, v in claims.items()
+        }
+        header = {"alg": algorithm, "typ": "JWT"}
+        segments = [
+            self._b64encode(json.dumps(header, separators=(",", ":")).encode()),
+            self._b64encode(json.dumps(claims, separators=(",", ":")).encode()),
+        ]
+        signing_input = b".".join(segments)
+        return (signing_input + b"." + self._b64encode(self._sign(signing_input, key, algorithm))).decode()
+
+    def decode(self, token: str, key: str, algorithms: List[str]) -> Dict[str, Any]:
+        try:
+            header_b64, claims_b64, signature_b64 = token.split(".")
+            header = json.loads(self._b64decode(header_b64))
+            algorithm = header["alg"]
+            if algorithm not in algorithms or algorithm not in self.DIGESTS:
+                raise TokenError("Algorithm not allowed")
+            expected = self._sign(f"{header_b64}.{claims_b64}".encode(), key, algorithm)
+            if not hmac.compare_digest(expected, self._b64decode(signature_b64)):
+                raise TokenError("Signature verification failed")
+            claims = json.loads(self._b64decode(claims_b64))
+        except (ValueError, KeyError, TypeError, binascii.Error) as e:
+            raise TokenError("Malformed token") from e
+        if not isinstance(claims, dict):
+            raise TokenError("Malformed token")
+
+        now = time.time()
+        try:
+            if "exp" in claims and now > float(claims["exp"]):
+                raise TokenError("Signature has expired")
+            if "nbf" in claims and now < float(claims["nbf"]):
+                raise TokenError("The token is not yet valid")
+        except (TypeError, ValueError) as e:
+            raise TokenError("Invalid time claim") from e
+        return claims
+
+
+BACKENDS = {"jose": JoseBackend, "hmac": HmacBackend}
+
+backend = BACKENDS[settings.JWT_BACKEND]()
+_verified = LocalLRU(settings.JWT_CACHE_SIZE, settings.JWT_CACHE_MAX_TTL)
+
+
+def encode_token(claims: Dict[str, Any]) -> str:
+    return backend.encode(claims, settings.SECRET_KEY, settings.ALGORITHM)
+
+
+def decode_token(token: str) -> Dict[str, Any]:
+    """
+    Перевіряє токен і повертає його claims, використовуючи кеш перевірених токенів.
+
+    :param token: JWT.
+    :return: Копія claims (кешований словник не змінюється викликачами).
+    :raises TokenError: Якщо підпис недійсний або токен прострочений.
+    """
+    key = hashlib.sha256(token.encode()).digest()
+    claims = _verified.get(key)
+    if claims is None:
+        claims = backend.decode(token, settings.SECRET_KEY, [settings.ALGORITHM])
+        ttl = settings.JWT_CACHE_MAX_TTL
+        if isinstance(claims.get("exp"), (int, float)):
+            ttl = min(ttl, claims["exp"] - time.time())
+        if ttl > 0:
+            _verified.set(key, claims, ttl=ttl)
+    return dict(claims)
+
+
+def token_cache_stats() -> dict:
+    return {"backend": backend.name, **_verified.stats()}
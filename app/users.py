@@ -1,15 +1,23 @@
-from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, status
-from sqlalchemy.orm import Session
-from fastapi_limiter.depends import RateLimiter
-from io import BytesIO
-import cloudinary.uploader as cu
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import RedirectResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.database import get_db
-from app import models, schemas
-from app.auth import get_current_user
-from app.deps import require_admin
+from app import avatars, crud, models, schemas
+from app.avatars import UPLOAD_OPENAPI
+from app.config import settings
+from app.auth import attach_principal, get_current_user
+from app.cache import drop_user_cache
+from app.deps import require_admin, user_rate_key
+from app.ratelimit import rate_limit
+from app.revocation import revoke_user_tokens
 
-router = APIRouter(prefix="/users", tags=["users"])
+router = APIRouter(
+    prefix="/users",
+    tags=["users"],
+    dependencies=[Depends(rate_limit("users", 60, 60, key=user_rate_key))],
+)
 
 DEFAULT_AVATAR = "https://res.cloudinary.com/demo/image/upload/sample.jpg"
 
@@ -17,42 +25,71 @@ DEFAULT_AVATAR = "https://res.cloudinary.com/demo/image/upload/sample.jpg"
 @router.get(
     "/me",
     response_model=schemas.UserOut,
-    dependencies=[Depends(RateLimiter(times=5, seconds=60))],
+    dependencies=[Depends(rate_limit("users.me", 5, 60, key=user_rate_key))],
 )
-def me(
-    db: Session = Depends(get_db),
-    current: models.User = Depends(get_current_user),
-):
-    user = db.get(models.User, current.id)
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Not authenticated",
-        )
-    return user
+async def me(current: models.User = Depends(get_current_user)):
+    return current
 
 
-@router.post("/me/avatar", response_model=schemas.UserOut)
+@router.post("/me/avatar", response_model=schemas.UserOut, openapi_extra=UPLOAD_OPENAPI)
 async def upload_avatar(
-    file: UploadFile = File(...),
-    db: Session = Depends(get_db),
+    request: Request,
+    db: AsyncSession = Depends(get_db),
     current: models.User = Depends(get_current_user),
 ):
-    data = await file.read()
+    """
+    Завантажує аватар поточного користувача.
+
+    Тіло читається потоково з лімітом розміру. Зображення адресується
+    sha256 вмісту: якщо такий вміст уже збережено (будь-яким користувачем),
+    вивантаження пропускається і лише перепризначається ``avatar_url``;
+    інакше розміри готуються і вивантажуються в пулі потоків, не блокуючи
+    event loop.
+
+    :param request: Запит з ``multipart/form-data`` полем ``file``.
+    :param db: Сесія БД.
+    :param current: Поточний користувач.
+    :return: Оновлений користувач.
+    :raises HTTPException: 413/415/422 — некоректний файл; 500 — помилка сховища.
+    """
+    data, content_type = await avatars.read_avatar(request)
+    key = avatars.digest(data)
+    user = await attach_principal(db, current)
     try:
-        res = cu.upload(
-            BytesIO(data),
-            folder="avatars",
-            public_id=str(current.id),
-            overwrite=True,
-        )
-        current.avatar_url = res["secure_url"]
-        db.commit()
-        db.refresh(current)
-        return current
+        variants = await avatars.get_variants(db, key)
+        if variants is None:
+            stored_type, variants = await run_in_threadpool(avatars.store_variants, key, data, content_type)
+            await crud.save_avatar_blob(db, key, stored_type, variants)
+        user.avatar_url = avatars.pick(variants, settings.AVATAR_SIZE)
+        user.avatar_hash = key
+        await db.commit()
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Upload failed: {e}")
 
+    await drop_user_cache(user.id)
+    return user
+
+
+@router.get("/me/avatar", response_class=RedirectResponse, status_code=status.HTTP_307_TEMPORARY_REDIRECT)
+async def get_avatar(
+    size: int = Query(settings.AVATAR_SIZE, ge=1),
+    db: AsyncSession = Depends(get_db),
+    current: models.User = Depends(get_current_user),
+):
+    """
+    Перенаправляє на аватар поточного користувача потрібного розміру.
+
+    :param size: Бажаний розмір у пікселях; обирається найближчий не менший з готових.
+    :param db: Сесія БД (лише при промаху кешу розмірів).
+    :param current: Поточний користувач.
+    :return: 307 на URL зображення.
+    """
+    variants = await avatars.get_variants(db, current.avatar_hash) if current.avatar_hash else None
+    url = avatars.pick(variants, size) if variants else current.avatar_url or DEFAULT_AVATAR
+    return RedirectResponse(url, status_code=status.HTTP_307_TEMPORARY_REDIRECT)
+
 
 # --- Дефолтна аватарка для адмінів ---
 @router.post(
@@ -62,15 +99,17 @@ async def upload_avatar(
 )
 async def set_default_avatar(
     user_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
-    user = db.get(models.User, user_id)
+    user = await db.get(models.User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
     user.avatar_url = DEFAULT_AVATAR
-    db.commit()
-    db.refresh(user)
+    user.avatar_hash = None
+    await db.commit()
+    await db.refresh(user)
+    await drop_user_cache(user.id)
     return user
 
 
@@ -83,9 +122,9 @@ async def set_default_avatar(
 async def update_user_role(
     user_id: int,
     body: schemas.UserRoleUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
-    user = db.get(models.User, user_id)
+    user = await db.get(models.User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
@@ -93,6 +132,9 @@ async def update_user_role(
         raise HTTPException(status_code=400, detail="Invalid role")
 
     user.role = body.role
-    db.commit()
-    db.refresh(user)
+    # старі токени не мають переживати зміну прав
+    await revoke_user_tokens(user.id)
+    await db.commit()
+    await db.refresh(user)
+    await drop_user_cache(user.id)
     return user
@@ -0,0 +1,295 @@
+"""
+Benchmark Contacts API.
+
+Засіює N користувачів × M контактів і ганяє реальний ASGI-застосунок
+in-process через httpx (або вже запущений uvicorn через ``--base-url``),
+вимірюючи пропускну здатність і p50/p95/p99 для основних маршрутів.
+Результат пишеться в JSON, щоб порівнювати коміти між собою.
+
+Запуск на SQLite + fakeredis::
+
+    python -m benchmarks.run --users 20 --contacts 500 --output bench.json
+    python -m benchmarks.run --compare bench.json --output bench-new.json
+
+Проти Postgres/Redis з docker-compose::
+
+    python -m benchmarks.run --database-url postgresql+psycopg://... --redis-url redis://...
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional
+
+PASSWORD = "benchmark-password"
+SCENARIOS = (
+    "login",
+    "read_contacts",
+    "read_contacts_search",
+    "upcoming_birthdays",
+    "create_contact",
+    "upload_avatar",
+)
+# 1×1 PNG
+AVATAR = bytes.fromhex(
+    "89504e470d0a1a0a0000000d4948445200000001000000010806000000"
+    "1f15c4890000000d49444154789c6360000002000154a24f5d0000000049454e44ae426082"
+)
+# ліміти запитів вимірювали б себе, а не застосунок
+UNLIMITED = json.dumps({name: "1000000000/1" for name in (
+    "auth", "auth.login", "auth.login.account", "contacts", "users", "users.me",
+)})
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    """Перцентиль методом nearest-rank по відсортованому списку."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, min(len(sorted_values), math.ceil(p / 100 * len(sorted_values))))
+    return sorted_values[rank - 1]
+
+
+def summarize(latencies: List[float], errors: int, elapsed: float) -> dict:
+    values = sorted(latencies)
+    return {
+        "requests": len(values),
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "rps": round(len(values) / elapsed, 1) if elapsed else 0.0,
+        "mean_ms": round(sum(values) / len(values) * 1000, 2) if values else 0.0,
+        "p50_ms": round(percentile(values, 50) * 1000, 2),
+        "p95_ms": round(percentile(values, 95) * 1000, 2),
+        "p99_ms": round(percentile(values, 99) * 1000, 2),
+        "max_ms": round(values[-1] * 1000, 2) if values else 0.0,
+    }
+
+
+async def seed(session_factory, users: int, contacts: int) -> List[dict]:
+    """Створює користувачів з контактами; дні народження рівномірно розкидані по року."""
+    from sqlalchemy import insert, select
+
+    from app import models
+    from app.auth import pwd_context
+
+    password_hash = pwd_context.hash(PASSWORD)
+    rnd = random.Random(42)
+    seeded = []
+    async with session_factory() as db:
+        for u in range(users):
+            email = f"bench{u}@example.com"
+            user = await db.scalar(select(models.User).where(models.User.email == email))
+            if user is None:
+                user = models.User(email=email, password_hash=password_hash, is_verified=1)
+                db.add(user)
+                await db.flush()
+                rows = []
+                for i in range(contacts):
+                    birthday = date(1990, 1, 1) + timedelta(days=rnd.randrange(365))
+                    rows.append({
+                        "owner_id": user.id,
+                        "name": f"First{u}x{i}",
+                        "last_name": f"Last{i}",
+                        "email": f"c{u}x{i}@bench.example.com",
+                        "phone": f"+380{u:03d}{i:06d}",
+                        "birthday": birthday,
+                        "birthday_md": models.birthday_key(birthday),
+                    })
+                for start in range(0, len(rows), 1000):
+                    await db.execute(insert(models.Contact), rows[start:start + 1000])
+            seeded.append({"id": user.id, "email": email})
+        await db.commit()
+    return seeded
+
+
+async def drive(
+    name: str,
+    request: Callable[[int], Awaitable[int]],
+    total: int,
+    concurrency: int,
+    first: int = 0,
+    report: bool = True,
+) -> dict:
+    latencies: List[float] = []
+    errors = 0
+    counter = iter(range(first, first + total))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            started = time.perf_counter()
+            try:
+                status = await request(i)
+            except Exception:
+                status = 599
+            latencies.append(time.perf_counter() - started)
+            if status >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    result = summarize(latencies, errors, time.perf_counter() - started)
+    if report:
+        print(f"{name:<22} {result['rps']:>9} rps  p50 {result['p50_ms']:>8} ms  "
+              f"p95 {result['p95_ms']:>8} ms  p99 {result['p99_ms']:>8} ms  errors {errors}")
+    return result
+
+
+def scenarios(client, users: List[dict], tokens: List[str], run_id: str) -> Dict[str, Callable[[int], Awaitable[int]]]:
+    def auth(i: int) -> dict:
+        return {"Authorization": f"Bearer {tokens[i % len(tokens)]}"}
+
+    async def login(i):
+        user = users[i % len(users)]
+        res = await client.post("/auth/login", data={"username": user["email"], "password": PASSWORD})
+        return res.status_code
+
+    async def read_contacts(i):
+        return (await client.get("/contacts/", params={"limit": 50}, headers=auth(i))).status_code
+
+    async def read_contacts_search(i):
+        params = {"search": f"Last{i % 100}", "limit": 50}
+        return (await client.get("/contacts/", params=params, headers=auth(i))).status_code
+
+    async def upcoming_birthdays(i):
+        return (await client.get("/contacts/upcoming-birthdays", params={"days": 7}, headers=auth(i))).status_code
+
+    async def create_contact(i):
+        res = await client.post("/contacts/", json={
+            "name": f"New{run_id}x{i}",
+            "last_name": "Bench",
+            "email": f"new{run_id}x{i}@bench.example.com",
+            "phone": "+380000000000",
+        }, headers=auth(i))
+        return res.status_code
+
+    async def upload_avatar(i):
+        files = {"file": ("avatar.png", AVATAR, "image/png")}
+        return (await client.post("/users/me/avatar", files=files, headers=auth(i))).status_code
+
+    return {
+        "login": login,
+        "read_contacts": read_contacts,
+        "read_contacts_search": read_contacts_search,
+        "upcoming_birthdays": upcoming_birthdays,
+        "create_contact": create_contact,
+        "upload_avatar": upload_avatar,
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(previous: dict, current: dict) -> None:
+    print(f"\n{'scenario':<22} {'rps':>16} {'p95 ms':>18}")
+    for name, now in current["scenarios"].items():
+        before = previous.get("scenarios", {}).get(name)
+        if not before:
+            continue
+        rps = (now["rps"] - before["rps"]) / before["rps"] * 100 if before["rps"] else 0.0
+        p95 = (now["p95_ms"] - before["p95_ms"]) / before["p95_ms"] * 100 if before["p95_ms"] else 0.0
+        print(f"{name:<22} {now['rps']:>9} ({rps:+5.1f}%) {now['p95_ms']:>10} ({p95:+5.1f}%)")
+
+
+async def run(args) -> dict:
+    import httpx
+
+    from app import cache, database, models
+    from app.auth import create_access_token
+    from app.main import app
+
+    if args.fake_redis:
+        import fakeredis.aioredis
+
+        cache._redis = fakeredis.aioredis.FakeRedis(decode_responses=True)
+        cache._redis_loop = asyncio.get_running_loop()
+
+    if args.base_url:
+        client = httpx.AsyncClient(base_url=args.base_url, timeout=30)
+    else:
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=30)
+
+    async with database.engine.begin() as conn:
+        await conn.run_sync(models.Base.metadata.create_all)
+    started = time.perf_counter()
+    users = await seed(database.SessionLocal, args.users, args.contacts)
+    seed_seconds = time.perf_counter() - started
+    tokens = [create_access_token({"sub": str(u["id"])}) for u in users]
+
+    selected = args.scenarios or list(SCENARIOS)
+    requests = scenarios(client, users, tokens, run_id=str(int(time.time())))
+    results = {}
+    async with client:
+        for name in selected:
+            # прогрів: кеш користувачів, пул з'єднань, JIT плану запиту
+            warmup = min(args.concurrency, args.requests)
+            await drive(name, requests[name], warmup, args.concurrency, first=args.requests, report=False)
+            results[name] = await drive(name, requests[name], args.requests, args.concurrency)
+
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "database": database.engine.dialect.name,
+            "redis": "fakeredis" if args.fake_redis else args.redis_url,
+            "target": args.base_url or "in-process",
+            "users": args.users,
+            "contacts_per_user": args.contacts,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "seed_seconds": round(seed_seconds, 3),
+        },
+        "scenarios": results,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the Contacts API.")
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--contacts", type=int, default=200, help="contacts per user")
+    parser.add_argument("--requests", type=int, default=500, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--database-url", default="sqlite+aiosqlite:///./bench.db")
+    parser.add_argument("--redis-url", default=None, help="real Redis; fakeredis when omitted")
+    parser.add_argument("--base-url", default=None, help="benchmark a running server instead of in-process")
+    parser.add_argument("--scenario", dest="scenarios", action="append", choices=SCENARIOS)
+    parser.add_argument("--output", default=None, help="write results as JSON")
+    parser.add_argument("--compare", default=None, help="previous JSON results to compare against")
+    args = parser.parse_args(argv)
+    args.fake_redis = args.redis_url is None
+
+    # налаштування читаються під час імпорту app, тож середовище готуємо заздалегідь
+    os.environ["DATABASE_URL"] = args.database_url
+    if args.redis_url:
+        os.environ["REDIS_URL"] = args.redis_url
+    os.environ.setdefault("RATE_LIMITS", UNLIMITED)
+    if not args.base_url:
+        # in-process аватари пишуться на диск, а не в хмару
+        os.environ.setdefault("AVATAR_STORAGE", "local")
+        os.environ.setdefault("AVATAR_LOCAL_DIR", tempfile.mkdtemp(prefix="bench-media-"))
+
+    result = asyncio.run(run(args))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), result)
+    json.dump(result["meta"], sys.stdout, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""
+Мікробенчмарк перевірки JWT: бекенди JOSE без кешу і ``decode_token`` з кешем.
+
+Запуск::
+
+    python -m benchmarks.tokens --iterations 20000
+"""
+import argparse
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable, List, Optional
+
+
+def measure(fn: Callable[[], object], iterations: int) -> dict:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    elapsed = time.perf_counter() - started
+    return {"ops_per_second": round(iterations / elapsed), "us_per_op": round(elapsed / iterations * 1e6, 2)}
+
+
+def run(iterations: int) -> dict:
+    from app import tokens
+    from app.config import settings
+
+    claims = {"sub": "1", "exp": datetime.now(timezone.utc) + timedelta(minutes=30)}
+    token = tokens.encode_token(claims)
+    results = {}
+    for name, backend_cls in tokens.BACKENDS.items():
+        backend = backend_cls()
+        results[name] = measure(lambda: backend.decode(token, settings.SECRET_KEY, [settings.ALGORITHM]), iterations)
+    tokens.decode_token(token)
+    results[f"cached ({tokens.backend.name})"] = measure(lambda: tokens.decode_token(token), iterations)
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark JWT validation.")
+    parser.add_argument("--iterations", type=int, default=10_000)
+    args = parser.parse_args(argv)
+    for name, result in run(args.iterations).items():
+        print(f"{name:<16} {result['ops_per_second']:>10} ops/s  {result['us_per_op']:>8} us/op")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""contacts updated_at and tombstones
+
+Revision ID: 5a7e91c3d2f4
+Revises: 83ed38ae8e30
+Create Date: 2026-10-17 13:02:44.118532
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5a7e91c3d2f4'
+down_revision: Union[str, Sequence[str], None] = '83ed38ae8e30'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('contacts', sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True))
+    op.add_column('contacts', sa.Column('deleted_at', sa.DateTime(timezone=True), nullable=True))
+    op.execute('UPDATE contacts SET updated_at = now()')
+    op.alter_column('contacts', 'updated_at', nullable=False)
+    op.create_index('ix_contacts_owner_id_updated_at', 'contacts', ['owner_id', 'updated_at'], unique=False)
+
+    # email must stay unique only among live contacts, otherwise a tombstone blocks re-creating it
+    op.drop_constraint('uq_contacts_email', 'contacts', type_='unique')
+    op.drop_index('ix_contacts_email', table_name='contacts')
+    op.create_index('ix_contacts_email', 'contacts', ['email'], unique=False)
+    op.create_index(
+        'uq_contacts_email',
+        'contacts',
+        ['email'],
+        unique=True,
+        postgresql_where=sa.text('deleted_at IS NULL'),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute('DELETE FROM contacts WHERE deleted_at IS NOT NULL')
+    op.drop_index('uq_contacts_email', table_name='contacts')
+    op.drop_index('ix_contacts_email', table_name='contacts')
+    op.create_index('ix_contacts_email', 'contacts', ['email'], unique=True)
+    op.create_unique_constraint('uq_contacts_email', 'contacts', ['email'])
+    op.drop_index('ix_contacts_owner_id_updated_at', table_name='contacts')
+    op.drop_column('contacts', 'deleted_at')
+    op.drop_column('contacts', 'updated_at')
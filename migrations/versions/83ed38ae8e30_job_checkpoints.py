@@ -0,0 +1,35 @@
+"""job checkpoints
+
+Revision ID: 83ed38ae8e30
+Revises: bdc11ecc6f5b
+Create Date: 2026-10-17 12:31:05.772914
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '83ed38ae8e30'
+down_revision: Union[str, Sequence[str], None] = 'bdc11ecc6f5b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'job_checkpoints',
+        sa.Column('job', sa.String(), nullable=False),
+        sa.Column('run_date', sa.Date(), nullable=False),
+        sa.Column('last_user_id', sa.Integer(), nullable=False),
+        sa.Column('completed', sa.Boolean(), nullable=False),
+        sa.PrimaryKeyConstraint('job', 'run_date'),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('job_checkpoints')
@@ -0,0 +1,28 @@
+"""contacts owner_id id index
+
+Revision ID: 924309f7f99a
+Revises: 25ffe14a2ab4
+Create Date: 2026-10-17 10:12:40.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '924309f7f99a'
+down_revision: Union[str, Sequence[str], None] = '25ffe14a2ab4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_contacts_owner_id_id', 'contacts', ['owner_id', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_contacts_owner_id_id', table_name='contacts')
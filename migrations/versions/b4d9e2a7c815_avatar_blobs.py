@@ -0,0 +1,37 @@
+"""avatar blobs
+
+Revision ID: b4d9e2a7c815
+Revises: 7c1f4e9a2b60
+Create Date: 2026-10-17 15:38:09.402157
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b4d9e2a7c815'
+down_revision: Union[str, Sequence[str], None] = '7c1f4e9a2b60'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'avatar_blobs',
+        sa.Column('digest', sa.String(length=64), nullable=False),
+        sa.Column('content_type', sa.String(), nullable=False),
+        sa.Column('variants', sa.JSON(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint('digest'),
+    )
+    op.add_column('users', sa.Column('avatar_hash', sa.String(length=64), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('users', 'avatar_hash')
+    op.drop_table('avatar_blobs')
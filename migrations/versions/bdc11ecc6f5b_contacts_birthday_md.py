@@ -0,0 +1,35 @@
+"""contacts birthday_md
+
+Revision ID: bdc11ecc6f5b
+Revises: c2d45899e6bb
+Create Date: 2026-10-17 11:48:27.305617
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'bdc11ecc6f5b'
+down_revision: Union[str, Sequence[str], None] = 'c2d45899e6bb'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('contacts', sa.Column('birthday_md', sa.SmallInteger(), nullable=True))
+    op.execute(
+        'UPDATE contacts '
+        'SET birthday_md = EXTRACT(MONTH FROM birthday) * 100 + EXTRACT(DAY FROM birthday) '
+        'WHERE birthday IS NOT NULL'
+    )
+    op.create_index('ix_contacts_owner_id_birthday_md', 'contacts', ['owner_id', 'birthday_md'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_contacts_owner_id_birthday_md', table_name='contacts')
+    op.drop_column('contacts', 'birthday_md')
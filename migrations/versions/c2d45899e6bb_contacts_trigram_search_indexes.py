@@ -0,0 +1,40 @@
+"""contacts trigram search indexes
+
+Revision ID: c2d45899e6bb
+Revises: 924309f7f99a
+Create Date: 2026-10-17 11:02:13.540911
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c2d45899e6bb'
+down_revision: Union[str, Sequence[str], None] = '924309f7f99a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TRGM_COLUMNS = ('name', 'last_name', 'email')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for column in TRGM_COLUMNS:
+        op.create_index(
+            f'ix_contacts_{column}_trgm',
+            'contacts',
+            [column],
+            unique=False,
+            postgresql_using='gin',
+            postgresql_ops={column: 'gin_trgm_ops'},
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for column in TRGM_COLUMNS:
+        op.drop_index(f'ix_contacts_{column}_trgm', table_name='contacts')
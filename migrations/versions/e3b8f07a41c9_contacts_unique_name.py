@@ -0,0 +1,34 @@
+"""contacts unique name
+
+Revision ID: e3b8f07a41c9
+Revises: 5a7e91c3d2f4
+Create Date: 2026-10-17 13:40:12.604819
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e3b8f07a41c9'
+down_revision: Union[str, Sequence[str], None] = '5a7e91c3d2f4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(
+        'uq_contacts_name',
+        'contacts',
+        ['name', 'last_name'],
+        unique=True,
+        postgresql_where=sa.text('deleted_at IS NULL'),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('uq_contacts_name', table_name='contacts')
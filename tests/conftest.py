@@ -1,19 +1,36 @@
 # tests/conftest.py
+import os
+
+# профілювання SQL потрібне для перевірки бюджетів запитів (test_query_budgets.py)
+os.environ.setdefault("DB_PROFILE", "true")
+
 import pytest
+import pytest_asyncio
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
 from fastapi.testclient import TestClient
 
 from app.models import Base, User
 from app.auth import create_access_token, hash_password
 from app.database import get_db
 from app.main import app
+from app import profiling
 
 # Підключення до тестової БД
 SQLALCHEMY_DATABASE_URL = "postgresql+psycopg://postgres:postgres@db:5432/test_contacts_db_hw12"
 engine = create_engine(SQLALCHEMY_DATABASE_URL)
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Застосунок працює з AsyncSession; NullPool, бо кожен TestClient і кожен
+# async-тест має власний event loop, а з'єднання прив'язані до loop
+async_engine = create_async_engine(SQLALCHEMY_DATABASE_URL, poolclass=NullPool)
+TestingAsyncSessionLocal = async_sessionmaker(
+    async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+)
+profiling.instrument(async_engine)
+
 
 # Тестова база
 @pytest.fixture(scope="session")
@@ -25,6 +42,19 @@ def db():
         yield db
     finally:
         db.close()
+
+
+# Async-сесія для прямих викликів crud
+@pytest_asyncio.fixture
+async def async_db(db):
+    async with TestingAsyncSessionLocal() as session:
+        yield session
+
+
+@pytest.fixture
+def async_session_factory(db):
+    return TestingAsyncSessionLocal
+
         
 # Токен адмін ролі   
 @pytest.fixture
@@ -50,10 +80,12 @@ def admin_token(db):
 # Переоприділення get_db для FastAPI
 @pytest.fixture(scope="module")
 def client(db):
-    def override_get_db():
+    async def override_get_db():
         try:
-            yield db
+            async with TestingAsyncSessionLocal() as session:
+                yield session
         finally:
+            # синхронна сесія тестів не має тримати стару транзакцію між запитами
             db.close()
 
     app.dependency_overrides[get_db] = override_get_db
@@ -100,3 +132,16 @@ def token(db):
             db.refresh(user)
 
     return create_access_token({"sub": str(user.id)})
+
+
+# Бюджет SQL-операторів на один HTTP-запит
+@pytest.fixture
+def query_budget(client):
+    def check(max_statements, method, url, **kwargs):
+        with profiling.capture_queries() as logs:
+            res = client.request(method, url, **kwargs)
+        assert logs, f"{method} {url} was not profiled"
+        assert logs[-1].count <= max_statements, logs[-1].report()
+        return res
+
+    return check
@@ -188,3 +188,80 @@ def test_login_email_not_verified(client):
     })
     assert res.status_code == 403
     assert res.json()["detail"] == "Email is not verified"
+
+
+def test_login_rate_limited_per_account(client):
+    for _ in range(10):
+        client.post("/auth/login", data={"username": "bruteforce@example.com", "password": "guess"})
+    res = client.post("/auth/login", data={"username": "bruteforce@example.com", "password": "guess"})
+    assert res.status_code == 429
+    assert "Retry-After" in res.headers
+
+
+def test_hmac_backend_interoperates_with_jose():
+    from app.tokens import HmacBackend, TokenError
+
+    backend = HmacBackend()
+    token = backend.encode({"sub": "7", "exp": 9999999999}, settings.SECRET_KEY, settings.ALGORITHM)
+    assert jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])["sub"] == "7"
+
+    token = jwt.encode({"sub": "7", "exp": 9999999999}, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+    assert backend.decode(token, settings.SECRET_KEY, [settings.ALGORITHM])["sub"] == "7"
+
+    expired = jwt.encode({"sub": "7", "exp": 1}, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+    forged = jwt.encode({"sub": "7"}, "another-key", algorithm=settings.ALGORITHM)
+    for bad in (expired, forged, "abc.def.ghi", "garbage"):
+        try:
+            backend.decode(bad, settings.SECRET_KEY, [settings.ALGORITHM])
+        except TokenError:
+            continue
+        raise AssertionError(bad)
+
+
+def test_decode_token_caches_verified_claims(monkeypatch):
+    from app import tokens
+
+    token = tokens.encode_token({"sub": "42", "exp": 9999999999})
+    calls = []
+    decode = tokens.backend.decode
+    monkeypatch.setattr(tokens.backend, "decode", lambda *a: calls.append(a) or decode(*a))
+
+    first = tokens.decode_token(token)
+    first["sub"] = "mutated"
+    assert tokens.decode_token(token)["sub"] == "42"
+    assert len(calls) == 1
+
+    try:
+        tokens.decode_token(token + "x")
+    except tokens.TokenError:
+        pass
+    try:
+        tokens.decode_token(token + "x")
+    except tokens.TokenError:
+        pass
+    assert len(calls) == 3
+
+
+def test_logout_revokes_only_current_token(client, token):
+    from app.auth import create_access_token, decode_token
+
+    other = create_access_token({"sub": decode_token(token)["sub"]})
+    res = client.post("/auth/logout", headers={"Authorization": f"Bearer {token}"})
+    assert res.status_code == 200
+
+    assert client.get("/users/me", headers={"Authorization": f"Bearer {token}"}).status_code == 401
+    assert client.get("/users/me", headers={"Authorization": f"Bearer {other}"}).status_code == 200
+
+
+def test_reset_confirm_revokes_old_tokens(client, db, token):
+    user = db.query(User).filter_by(email="contactuser@example.com").first()
+    res = client.post("/auth/reset/request", json={"email": user.email})
+    reset_token = res.json()["token"]
+
+    res = client.post("/auth/reset/confirm", json={"token": reset_token, "new_password": "contactpass"})
+    assert res.status_code == 200
+
+    assert client.get("/users/me", headers={"Authorization": f"Bearer {token}"}).status_code == 401
+    # токен скидання одноразовий
+    res = client.post("/auth/reset/confirm", json={"token": reset_token, "new_password": "contactpass"})
+    assert res.status_code == 400
@@ -0,0 +1,17 @@
+from benchmarks.run import percentile, summarize
+
+
+def test_percentile_nearest_rank():
+    values = [i / 1000 for i in range(1, 101)]
+    assert percentile(values, 50) == 0.05
+    assert percentile(values, 99) == 0.099
+    assert percentile([], 95) == 0.0
+
+
+def test_summarize_reports_latency_and_throughput():
+    result = summarize([0.01, 0.02, 0.03, 0.04], errors=1, elapsed=2.0)
+    assert result["requests"] == 4
+    assert result["errors"] == 1
+    assert result["rps"] == 2.0
+    assert result["p50_ms"] == 20.0
+    assert result["max_ms"] == 40.0
@@ -1,4 +1,7 @@
-from app import crud, schemas, models
+import json
+from datetime import date, timedelta
+
+from app import contacts, crud, database, schemas, models
 
 
 def test_get_contacts_empty(client, db, token):
@@ -58,3 +61,296 @@ def test_check_duplicates_name_conflict(client, db, token):
 def test_delete_contact_not_found(client, token):
     res = client.delete("/contacts/99999", headers={"Authorization": f"Bearer {token}"})
     assert res.status_code == 404
+
+
+def test_read_contacts_cursor_pagination(client, db, token):
+    headers = {"Authorization": f"Bearer {token}"}
+    for i in range(3):
+        client.post("/contacts/", json={
+            "name": f"Page{i}",
+            "last_name": "Cursor",
+            "email": f"page{i}@cursor.com",
+            "phone": "100",
+        }, headers=headers)
+
+    res = client.get("/contacts/", params={"limit": 1}, headers=headers)
+    assert res.status_code == 200
+    first_page = res.json()
+    assert len(first_page) == 1
+    cursor = res.headers["X-Next-Cursor"]
+
+    res = client.get("/contacts/", params={"limit": 1, "cursor": cursor}, headers=headers)
+    assert res.status_code == 200
+    assert res.json()[0]["id"] > first_page[0]["id"]
+
+
+def test_read_contacts_invalid_cursor(client, token):
+    res = client.get("/contacts/", params={"cursor": "!!"}, headers={"Authorization": f"Bearer {token}"})
+    assert res.status_code == 400
+
+
+def test_export_contacts_ndjson(client, token):
+    headers = {"Authorization": f"Bearer {token}"}
+    listed = client.get("/contacts/", params={"limit": 500}, headers=headers).json()
+
+    res = client.get("/contacts/export", headers=headers)
+    assert res.status_code == 200
+    assert res.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in res.text.splitlines()]
+    assert [r["id"] for r in rows] == [c["id"] for c in listed]
+
+
+def test_export_contacts_csv(client, token):
+    res = client.get("/contacts/export", params={"format": "csv"}, headers={"Authorization": f"Bearer {token}"})
+    assert res.status_code == 200
+    assert res.text.splitlines()[0].startswith("id,owner_id,name")
+
+
+def test_bulk_create_contacts_json(client, token):
+    rows = [
+        {"name": "Bulk", "last_name": "One", "email": "bulk1@example.com", "phone": "1"},
+        {"name": "Bulk", "last_name": "Two", "email": "john@example.com", "phone": "2"},
+        {"name": "Bulk", "last_name": "Three", "email": "bulk1@example.com", "phone": "3"},
+        {"name": "Bulk", "last_name": "Four", "email": "not-an-email", "phone": "4"},
+    ]
+    res = client.post("/contacts/bulk", json=rows, headers={"Authorization": f"Bearer {token}"})
+    assert res.status_code == 200
+    data = res.json()
+    assert [r["status"] for r in data["results"]] == ["created", "duplicate", "duplicate", "invalid"]
+    assert data["created"] == 1
+    assert data["duplicates"] == 2
+    assert data["invalid"] == 1
+
+
+def test_bulk_create_contacts_ndjson_and_csv(client, token):
+    ndjson = "\n".join(json.dumps(r) for r in [
+        {"name": "Nd", "last_name": "One", "email": "nd1@example.com", "phone": "1"},
+        {"name": "Nd", "last_name": "Two", "email": "nd2@example.com", "phone": "2"},
+    ])
+    res = client.post(
+        "/contacts/bulk",
+        content=ndjson,
+        headers={"Authorization": f"Bearer {token}", "Content-Type": "application/x-ndjson"},
+    )
+    assert res.status_code == 200
+    assert res.json()["created"] == 2
+
+    body = "name,last_name,email,phone,birthday\nCsv,One,csv1@example.com,1,1990-05-01\nCsv,Two,csv2@example.com,2,\n"
+    res = client.post(
+        "/contacts/bulk",
+        content=body,
+        headers={"Authorization": f"Bearer {token}", "Content-Type": "text/csv"},
+    )
+    assert res.status_code == 200
+    assert res.json()["created"] == 2
+
+
+def test_bulk_import_handles_chunked_utf8_and_multiline_csv(client, token):
+    headers = {"Authorization": f"Bearer {token}"}
+    line = json.dumps({"name": "Олена", "last_name": "Чанк", "email": "chunk@example.com", "phone": "1"}, ensure_ascii=False)
+    raw = line.encode()
+    split = raw.index("О".encode()) + 1  # посеред двобайтового символу
+    res = client.post(
+        "/contacts/bulk",
+        content=iter([raw[:split], raw[split:]]),
+        headers={**headers, "Content-Type": "application/x-ndjson"},
+    )
+    assert res.status_code == 200
+    assert res.json()["created"] == 1
+
+    body = '\ufeffname,last_name,email,phone,extra\nMulti,Line,multi@example.com,1,"first\nsecond"\nNext,Row,next@example.com,2,\n'
+    res = client.post(
+        "/contacts/bulk",
+        content=body.encode(),
+        headers={**headers, "Content-Type": "text/csv"},
+    )
+    assert res.status_code == 200
+    assert [r["status"] for r in res.json()["results"]] == ["created", "created"]
+
+    res = client.post(
+        "/contacts/bulk",
+        content=b'{"name": "\xff"}\n',
+        headers={**headers, "Content-Type": "application/x-ndjson"},
+    )
+    assert res.status_code == 400
+
+
+def test_bulk_import_over_limit_reports_committed_rows(client, token, monkeypatch):
+    headers = {"Authorization": f"Bearer {token}"}
+    monkeypatch.setattr(contacts, "BULK_BATCH_SIZE", 2)
+    monkeypatch.setattr(contacts, "BULK_MAX_ROWS", 3)
+    etag = client.get("/contacts/", headers=headers).headers["ETag"]
+
+    rows = [{"name": "Cap", "last_name": str(i), "email": f"cap{i}@example.com", "phone": str(i)} for i in range(5)]
+    res = client.post("/contacts/bulk", json=rows, headers=headers)
+    assert res.status_code == 413
+    data = res.json()
+    assert data["created"] == 3
+    assert "index 3" in data["detail"]
+
+    res = client.get("/contacts/", headers={**headers, "If-None-Match": etag})
+    assert res.status_code == 200
+
+
+def test_read_contacts_search(client, token):
+    res = client.get("/contacts/", params={"search": "bulk1"}, headers={"Authorization": f"Bearer {token}"})
+    assert res.status_code == 200
+    assert [c["email"] for c in res.json()] == ["bulk1@example.com"]
+
+
+def test_upcoming_birthdays(client, token):
+    headers = {"Authorization": f"Bearer {token}"}
+    soon = date.today() + timedelta(days=3)
+    res = client.post("/contacts/", json={
+        "name": "Birthday",
+        "last_name": "Soon",
+        "email": "bday@soon.com",
+        "phone": "333",
+        "birthday": soon.replace(year=1992).isoformat(),
+    }, headers=headers)
+    contact_id = res.json()["id"]
+
+    res = client.get("/contacts/upcoming-birthdays", params={"days": 7}, headers=headers)
+    assert res.status_code == 200
+    assert contact_id in [c["id"] for c in res.json()]
+
+
+def test_reads_use_replica_until_user_writes(client, token, async_session_factory, monkeypatch):
+    replica_sessions = []
+
+    def replica_factory():
+        replica_sessions.append(1)
+        return async_session_factory()
+
+    monkeypatch.setattr(database, "ReplicaSessionLocal", replica_factory)
+    headers = {"Authorization": f"Bearer {token}"}
+
+    assert client.get("/contacts/", headers=headers).status_code == 200
+    assert len(replica_sessions) == 1
+
+    client.post("/contacts/", json={
+        "name": "Sticky",
+        "last_name": "Primary",
+        "email": "sticky@primary.com",
+        "phone": "5",
+    }, headers=headers)
+    assert client.get("/contacts/", headers=headers).status_code == 200
+    assert len(replica_sessions) == 1
+
+
+def test_contacts_etag_revalidation(client, token):
+    headers = {"Authorization": f"Bearer {token}"}
+    res = client.get("/contacts/", headers=headers)
+    etag = res.headers["ETag"]
+
+    res = client.get("/contacts/", headers={**headers, "If-None-Match": etag})
+    assert res.status_code == 304
+    assert res.content == b""
+
+    res = client.post("/contacts/", json={
+        "name": "Etag",
+        "last_name": "Bump",
+        "email": "etag@bump.com",
+        "phone": "6",
+    }, headers=headers)
+    contact_id = res.json()["id"]
+    res = client.get("/contacts/", headers={**headers, "If-None-Match": etag})
+    assert res.status_code == 200
+    assert res.headers["ETag"] != etag
+
+    item = client.get(f"/contacts/{contact_id}", headers=headers)
+    res = client.get(f"/contacts/{contact_id}", headers={**headers, "If-None-Match": item.headers["ETag"]})
+    assert res.status_code == 304
+    client.delete(f"/contacts/{contact_id}", headers=headers)
+    res = client.get(f"/contacts/{contact_id}", headers={**headers, "If-None-Match": item.headers["ETag"]})
+    assert res.status_code == 404
+
+
+def test_contact_changes_defers_unsettled_writes(client, token, monkeypatch):
+    from app import contacts
+    monkeypatch.setattr(contacts, "CHANGES_SETTLE", timedelta(seconds=30))
+    headers = {"Authorization": f"Bearer {token}"}
+    since = client.get("/contacts/changes", headers=headers).json()["since"]
+    client.post("/contacts/", json={
+        "name": "Fresh",
+        "last_name": "Write",
+        "email": "fresh@write.com",
+        "phone": "9",
+    }, headers=headers)
+    res = client.get("/contacts/changes", params={"since": since}, headers=headers).json()
+    assert res["updated"] == []
+    assert res["since"] == since
+
+
+def test_contact_changes_since_watermark(client, token, monkeypatch):
+    from app import contacts
+    monkeypatch.setattr(contacts, "CHANGES_SETTLE", timedelta(0))
+    headers = {"Authorization": f"Bearer {token}"}
+    res = client.get("/contacts/changes", headers=headers)
+    assert res.status_code == 200
+    since = res.json()["since"]
+
+    created = client.post("/contacts/", json={
+        "name": "Delta",
+        "last_name": "Sync",
+        "email": "delta@sync.com",
+        "phone": "8",
+    }, headers=headers).json()
+    res = client.get("/contacts/changes", params={"since": since}, headers=headers).json()
+    assert [c["id"] for c in res["updated"]] == [created["id"]]
+    assert res["deleted"] == []
+
+    client.delete(f"/contacts/{created['id']}", headers=headers)
+    res = client.get("/contacts/changes", params={"since": res["since"]}, headers=headers).json()
+    assert res["updated"] == []
+    assert res["deleted"] == [created["id"]]
+
+    assert created["id"] not in [c["id"] for c in client.get("/contacts/", headers=headers).json()]
+    res = client.post("/contacts/", json={
+        "name": "Delta2",
+        "last_name": "Sync2",
+        "email": "delta@sync.com",
+        "phone": "8",
+    }, headers=headers)
+    assert res.status_code == 201
+
+
+def test_update_contact_maps_unique_violations(client, token):
+    headers = {"Authorization": f"Bearer {token}"}
+    first = client.post("/contacts/", json={
+        "name": "Unique", "last_name": "One", "email": "unique-one@example.com", "phone": "1",
+    }, headers=headers).json()
+    client.post("/contacts/", json={
+        "name": "Unique", "last_name": "Two", "email": "unique-two@example.com", "phone": "2",
+    }, headers=headers)
+
+    res = client.patch(f"/contacts/{first['id']}", json={"phone": "11"}, headers=headers)
+    assert res.status_code == 200
+    assert res.json()["phone"] == "11"
+
+    res = client.patch(f"/contacts/{first['id']}", json={"email": "unique-two@example.com"}, headers=headers)
+    assert res.status_code == 409
+    assert res.json()["detail"] == "Contact with this email already exists"
+
+    res = client.patch(f"/contacts/{first['id']}", json={"last_name": "Two"}, headers=headers)
+    assert res.status_code == 409
+    assert res.json()["detail"] == "Contact with this name already exists"
+
+
+def test_create_contact_upsert(client, token, admin_token):
+    headers = {"Authorization": f"Bearer {token}"}
+    contact = {"name": "Upsert", "last_name": "Me", "email": "upsert@example.com", "phone": "1"}
+    created = client.post("/contacts/", json=contact, headers=headers).json()
+
+    res = client.post("/contacts/", params={"on_conflict": "update"}, json={**contact, "phone": "2"}, headers=headers)
+    assert res.status_code == 201
+    assert res.json()["id"] == created["id"]
+    assert res.json()["phone"] == "2"
+
+    res = client.post(
+        "/contacts/",
+        params={"on_conflict": "update"},
+        json={**contact, "name": "Other"},
+        headers={"Authorization": f"Bearer {admin_token}"},
+    )
+    assert res.status_code == 409
@@ -1,7 +1,12 @@
+from datetime import date
+
+import pytest
+
 from app import crud, models, schemas
 
 
-def test_create_contact_direct(db):
+@pytest.mark.asyncio
+async def test_create_contact_direct(db, async_db):
     user = db.query(models.User).filter_by(email="contactuser@example.com").first()
 
     contact_in = schemas.ContactCreate(
@@ -10,12 +15,13 @@ def test_create_contact_direct(db):
         email="test@contact.com",
         phone="+1234567890"
     )
-    contact = crud.create_contact(db, contact_in, user.id)
+    contact = await crud.create_contact(async_db, contact_in, user.id)
     assert contact.name == "Test"
     assert contact.email == "test@contact.com"
 
 
-def test_get_contact_direct(db):
+@pytest.mark.asyncio
+async def test_get_contact_direct(db, async_db):
     user = db.query(models.User).filter_by(email="contactuser@example.com").first()
 
     contact_in = schemas.ContactCreate(
@@ -24,17 +30,18 @@ def test_get_contact_direct(db):
         email="direct@example.com",
         phone="+380991112233"
     )
-    contact = crud.create_contact(db, contact_in, user.id)
+    contact = await crud.create_contact(async_db, contact_in, user.id)
 
-    fetched = crud.get_contact(db, contact.id, user.id)
+    fetched = await crud.get_contact(async_db, contact.id, user.id)
     assert fetched is not None
     assert fetched.email == "direct@example.com"
 
-    deleted = crud.delete_contact(db, contact.id, user.id)
+    deleted = await crud.delete_contact(async_db, contact.id, user.id)
     assert deleted is True
 
 
-def test_update_contact(db):
+@pytest.mark.asyncio
+async def test_update_contact(db, async_db):
     user = db.query(models.User).filter_by(email="contactuser@example.com").first()
 
     contact_in = schemas.ContactCreate(
@@ -43,33 +50,61 @@ def test_update_contact(db):
         email="updatable@example.com",
         phone="+3800000000"
     )
-    contact = crud.create_contact(db, contact_in, user.id)
+    contact = await crud.create_contact(async_db, contact_in, user.id)
 
-    updated = crud.update_contact(db, contact.id, user.id, schemas.ContactUpdate(name="New"))
+    updated = await crud.update_contact(async_db, contact.id, user.id, schemas.ContactUpdate(name="New"))
     assert updated.name == "New"
 
 
-def test_get_contacts(db):
+@pytest.mark.asyncio
+async def test_get_contacts(db, async_db):
     user = db.query(models.User).filter_by(email="contactuser@example.com").first()
-    contacts = crud.get_contacts(db, user.id)
+    contacts = await crud.get_contacts(async_db, user.id)
     assert isinstance(contacts, list)
 
 
-def test_get_contact(db):
+@pytest.mark.asyncio
+async def test_get_contact(db, async_db):
     user = db.query(models.User).filter_by(email="contactuser@example.com").first()
-    contact = crud.create_contact(db, schemas.ContactCreate(
+    contact = await crud.create_contact(async_db, schemas.ContactCreate(
         name="Direct", last_name="Get", email="direct@get.com", phone="+1234567890"
     ), user.id)
 
-    found = crud.get_contact(db, contact.id, user.id)
+    found = await crud.get_contact(async_db, contact.id, user.id)
     assert found.email == "direct@get.com"
 
 
-def test_search_contact(db):
+@pytest.mark.asyncio
+async def test_search_contact(db, async_db):
     user = db.query(models.User).filter_by(email="contactuser@example.com").first()
-    crud.create_contact(db, schemas.ContactCreate(
+    await crud.create_contact(async_db, schemas.ContactCreate(
         name="Anna", last_name="Search", email="anna@search.com", phone="111"
     ), user.id)
 
-    results = crud.search_contacts(db, user.id, query="Ann")
+    results = await crud.search_contacts(async_db, user.id, query="Ann")
     assert any(c.name == "Anna" for c in results)
+
+
+@pytest.mark.asyncio
+async def test_get_contacts_keyset(db, async_db):
+    user = db.query(models.User).filter_by(email="contactuser@example.com").first()
+    first_page = await crud.get_contacts(async_db, user.id, limit=1)
+    assert len(first_page) == 1
+
+    next_page = await crud.get_contacts(async_db, user.id, after_id=first_page[0].id, limit=1)
+    assert all(c.id > first_page[0].id for c in next_page)
+
+
+@pytest.mark.asyncio
+async def test_upcoming_birthdays_feb_29_in_non_leap_year(db, async_db):
+    user = db.query(models.User).filter_by(email="contactuser@example.com").first()
+    leap = await crud.create_contact(async_db, schemas.ContactCreate(
+        name="Leap", last_name="Day", email="leap@day.com", phone="229", birthday=date(1992, 2, 29)
+    ), user.id)
+    assert leap.birthday_md == 229
+
+    upcoming = await crud.get_upcoming_birthdays(async_db, user.id, days=3, today=date(2025, 2, 27))
+    assert leap.id in [c.id for c in upcoming]
+
+    wrapped = await crud.get_upcoming_birthdays(async_db, user.id, days=70, today=date(2024, 12, 31))
+    assert leap.id in [c.id for c in wrapped]
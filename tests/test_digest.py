@@ -0,0 +1,75 @@
+import asyncio
+from datetime import date
+
+import pytest
+from sqlalchemy import func, select
+
+from app import digest, models
+from app.digest import run_digest
+
+
+class FakeMailer:
+    def __init__(self):
+        self.messages = []
+
+    async def send_message(self, message):
+        self.messages.append(message)
+
+
+def test_birthday_digest_sends_one_email_per_user_and_resumes(db, async_session_factory):
+    user = models.User(email="digest@example.com", password_hash="notused", is_verified=True)
+    db.add(user)
+    db.commit()
+    for i, day in enumerate((2, 4)):
+        db.add(models.Contact(
+            name=f"Digest{i}", last_name="Friend", email=f"digest{i}@friend.com",
+            phone="1", birthday=date(1990, 6, day), owner_id=user.id,
+        ))
+    db.commit()
+
+    mailer = FakeMailer()
+    stats = asyncio.run(run_digest(days=7, today=date(2031, 6, 1), session_factory=async_session_factory, mailer=mailer))
+
+    mine = [m for m in mailer.messages if "digest@example.com" in m.recipients]
+    assert len(mine) == 1
+    assert "Digest0 Friend" in mine[0].body and "Digest1 Friend" in mine[0].body
+    assert stats["sent"] == len(mailer.messages)
+
+    again = asyncio.run(run_digest(days=7, today=date(2031, 6, 1), session_factory=async_session_factory, mailer=mailer))
+    assert again["skipped"] is True
+
+
+def test_birthday_digest_outbox_is_not_duplicated_after_crash(db, async_session_factory, monkeypatch):
+    emails = [f"crash{i}@example.com" for i in range(3)]
+    for email in emails:
+        user = models.User(email=email, password_hash="notused", is_verified=True)
+        db.add(user)
+        db.commit()
+        db.add(models.Contact(
+            name="Crash", last_name=email, email=f"friend-{email}",
+            phone="1", birthday=date(1990, 7, 3), owner_id=user.id,
+        ))
+        db.commit()
+
+    save_checkpoint = digest._save_checkpoint
+    calls = []
+
+    async def crash_on_second_chunk(*args, **kwargs):
+        calls.append(1)
+        if len(calls) == 2:
+            raise RuntimeError("worker killed")
+        await save_checkpoint(*args, **kwargs)
+
+    monkeypatch.setattr(digest, "_save_checkpoint", crash_on_second_chunk)
+    run_date = date(2032, 7, 1)
+    with pytest.raises(RuntimeError):
+        asyncio.run(run_digest(days=7, today=run_date, chunk_size=1, session_factory=async_session_factory))
+    monkeypatch.setattr(digest, "_save_checkpoint", save_checkpoint)
+    asyncio.run(run_digest(days=7, today=run_date, chunk_size=1, session_factory=async_session_factory))
+
+    counts = dict(db.execute(
+        select(models.OutboxMessage.recipient, func.count())
+        .where(models.OutboxMessage.recipient.in_(emails))
+        .group_by(models.OutboxMessage.recipient)
+    ).all())
+    assert counts == {email: 1 for email in emails}
@@ -0,0 +1,87 @@
+import asyncio
+from datetime import date, datetime, timezone
+
+from app import models
+from app.config import settings
+from app.digest import run_digest
+from app.outbox import FAILED, PENDING, SENT, OutboxWorker, retry_delay
+
+
+class FakeTransport:
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.messages = []
+
+    async def send(self, message):
+        if self.fail:
+            raise OSError("connection refused")
+        self.messages.append(message)
+
+
+def _drain(worker):
+    async def run():
+        while await worker.drain_once():
+            pass
+
+    asyncio.run(run())
+
+
+def test_signup_mail_is_delivered_through_outbox(client, db, async_session_factory):
+    res = client.post("/auth/signup", json={"email": "outbox@example.com", "password": "outbox123"})
+    assert res.status_code == 201
+
+    queued = db.query(models.OutboxMessage).filter_by(recipient="outbox@example.com").one()
+    assert queued.status == PENDING
+    assert "verification token" in queued.body
+
+    transport = FakeTransport()
+    worker = OutboxWorker(session_factory=async_session_factory, transport=transport)
+    _drain(worker)
+
+    assert any(m["To"] == "outbox@example.com" for m in transport.messages)
+    db.expire_all()
+    sent = db.query(models.OutboxMessage).filter_by(recipient="outbox@example.com").one()
+    assert sent.status == SENT and sent.sent_at is not None
+    assert worker.stats()["sent"] == len(transport.messages)
+
+
+def test_failed_delivery_is_retried_then_given_up(db, async_session_factory, monkeypatch):
+    db.add(models.OutboxMessage(recipient="bounce@example.com", subject="s", body="b"))
+    db.commit()
+
+    worker = OutboxWorker(session_factory=async_session_factory, transport=FakeTransport(fail=True))
+    _drain(worker)
+    db.expire_all()
+    message = db.query(models.OutboxMessage).filter_by(recipient="bounce@example.com").one()
+    assert message.status == PENDING and message.attempts == 1
+    assert "connection refused" in message.last_error
+    assert message.next_attempt_at.replace(tzinfo=timezone.utc) > datetime.now(timezone.utc)
+
+    monkeypatch.setattr(settings, "MAIL_MAX_ATTEMPTS", 2)
+    message.next_attempt_at = datetime.now(timezone.utc)
+    db.commit()
+    _drain(worker)
+    db.expire_all()
+    message = db.query(models.OutboxMessage).filter_by(recipient="bounce@example.com").one()
+    assert message.status == FAILED and message.attempts == 2
+
+
+def test_retry_delay_grows_exponentially():
+    assert retry_delay(1) <= settings.MAIL_RETRY_BASE_SECONDS
+    assert retry_delay(4) >= settings.MAIL_RETRY_BASE_SECONDS * 4
+    assert retry_delay(100) <= settings.MAIL_RETRY_MAX_SECONDS
+
+
+def test_birthday_digest_enqueues_by_default(db, async_session_factory):
+    user = models.User(email="digest-outbox@example.com", password_hash="notused", is_verified=True)
+    db.add(user)
+    db.commit()
+    db.add(models.Contact(
+        name="Queued", last_name="Friend", email="queued@friend.com",
+        phone="1", birthday=date(1990, 9, 3), owner_id=user.id,
+    ))
+    db.commit()
+
+    asyncio.run(run_digest(days=7, today=date(2031, 9, 1), session_factory=async_session_factory))
+    queued = db.query(models.OutboxMessage).filter_by(recipient="digest-outbox@example.com").one()
+    assert "Queued Friend" in queued.body
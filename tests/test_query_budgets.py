@@ -0,0 +1,47 @@
+import logging
+
+import pytest
+
+from app import profiling
+
+
+@pytest.fixture
+def headers(client, token):
+    headers = {"Authorization": f"Bearer {token}"}
+    # прогріваємо кеш користувача, щоб бюджети рахували лише роботу маршруту
+    client.get("/users/me", headers=headers)
+    return headers
+
+
+def test_contact_endpoints_query_budgets(query_budget, headers):
+    res = query_budget(1, "POST", "/contacts/", json={
+        "name": "Budget", "last_name": "Check", "email": "budget@example.com", "phone": "1",
+    }, headers=headers)
+    assert res.status_code == 201
+    contact_id = res.json()["id"]
+
+    query_budget(1, "GET", "/contacts/", headers=headers)
+    query_budget(1, "GET", f"/contacts/{contact_id}", headers=headers)
+    query_budget(1, "PATCH", f"/contacts/{contact_id}", json={"phone": "2"}, headers=headers)
+    query_budget(1, "GET", "/contacts/changes", headers=headers)
+    query_budget(1, "POST", "/contacts/bulk", json=[
+        {"name": f"Budget{i}", "last_name": "Bulk", "email": f"budget{i}@example.com", "phone": "3"}
+        for i in range(20)
+    ], headers=headers)
+    query_budget(2, "DELETE", f"/contacts/{contact_id}", headers=headers)
+    query_budget(0, "GET", "/users/me", headers=headers)
+
+
+def test_fingerprint_normalizes_literals_and_in_lists():
+    a = profiling.fingerprint("SELECT * FROM contacts WHERE id IN (1, 2, 3) AND email = 'a@b.com'")
+    b = profiling.fingerprint("SELECT *  FROM contacts WHERE id IN (?, ?) AND email = %(email_1)s")
+    assert a == b == "SELECT * FROM contacts WHERE id IN (?) AND email = ?"
+
+
+def test_repeated_statements_flagged_as_n_plus_one(caplog):
+    log = profiling.QueryLog("GET", "/contacts/")
+    for i in range(profiling.settings.DB_PROFILE_REPEAT_THRESHOLD):
+        log.statements.append((profiling.fingerprint(f"SELECT * FROM users WHERE id = {i}"), "", 0.001))
+    with caplog.at_level(logging.WARNING, logger="app.profiling"):
+        profiling._finish(log)
+    assert "possible N+1" in caplog.text
@@ -1,5 +1,16 @@
+import asyncio
+import hashlib
 from unittest.mock import patch
 from app.models import User
+from app.cache import get_user_from_cache
+from app.config import settings
+from app.storage import LocalStorage
+
+# 1×1 PNG
+PNG = bytes.fromhex(
+    "89504e470d0a1a0a0000000d4948445200000001000000010806000000"
+    "1f15c4890000000d49444154789c6360000002000154a24f5d0000000049454e44ae426082"
+)
 
 
 def test_get_current_user(client, db, token):
@@ -8,16 +19,80 @@ def test_get_current_user(client, db, token):
     assert "email" in res.json()
 
 
-@patch("app.users.cu.upload")
+@patch("app.storage.cu.upload")
 def test_upload_avatar_mocked(mock_upload, client, db, token):
     mock_upload.return_value = {"secure_url": "https://mocked.url/avatar.png"}
 
-    file_data = {"file": ("avatar.png", b"imagebytes", "image/png")}
+    file_data = {"file": ("avatar.png", PNG + b"mocked", "image/png")}
     res = client.post("/users/me/avatar", files=file_data, headers={"Authorization": f"Bearer {token}"})
     assert res.status_code == 200
     assert res.json()["avatar_url"] == "https://mocked.url/avatar.png"
 
 
+@patch("app.storage.cu.upload")
+def test_upload_avatar_with_cached_principal(mock_upload, client, db, token):
+    mock_upload.return_value = {"secure_url": "https://mocked.url/cached.png"}
+    headers = {"Authorization": f"Bearer {token}"}
+    me = client.get("/users/me", headers=headers).json()
+    assert asyncio.run(get_user_from_cache(me["id"])) is not None
+
+    file_data = {"file": ("avatar.png", PNG + b"cached", "image/png")}
+    res = client.post("/users/me/avatar", files=file_data, headers=headers)
+    assert res.status_code == 200
+    db.expire_all()
+    assert db.get(User, me["id"]).avatar_url == "https://mocked.url/cached.png"
+
+
+def test_upload_avatar_to_local_storage(client, token, tmp_path, monkeypatch):
+    monkeypatch.setattr("app.storage.backend", LocalStorage(str(tmp_path), "/media"))
+    headers = {"Authorization": f"Bearer {token}"}
+
+    data = PNG + b"local"
+    res = client.post("/users/me/avatar", files={"file": ("a.bin", data, "application/octet-stream")}, headers=headers)
+    assert res.status_code == 200
+    digest = hashlib.sha256(data).hexdigest()
+    assert res.json()["avatar_url"] == f"/media/avatars/{digest}/{settings.AVATAR_SIZE}.png"
+    assert len(list((tmp_path / "avatars" / digest).iterdir())) == len(settings.AVATAR_VARIANT_SIZES)
+
+    res = client.get("/users/me/avatar", params={"size": 50}, headers=headers, follow_redirects=False)
+    assert res.status_code == 307
+    assert res.headers["location"].startswith(f"/media/avatars/{digest}/64.png")
+
+
+def test_identical_avatars_are_uploaded_once(client, token, admin_token, tmp_path, monkeypatch):
+    backend = LocalStorage(str(tmp_path), "/media")
+    saves = []
+    save = backend.save
+    monkeypatch.setattr(backend, "save", lambda *a: saves.append(a[0]) or save(*a))
+    monkeypatch.setattr("app.storage.backend", backend)
+    files = {"file": ("logo.png", PNG + b"company-logo", "image/png")}
+
+    first = client.post("/users/me/avatar", files=files, headers={"Authorization": f"Bearer {token}"})
+    second = client.post("/users/me/avatar", files=files, headers={"Authorization": f"Bearer {admin_token}"})
+    assert first.status_code == second.status_code == 200
+    assert first.json()["avatar_url"] == second.json()["avatar_url"]
+    assert len(saves) == len(settings.AVATAR_VARIANT_SIZES)
+
+
+def test_upload_avatar_rejects_non_images(client, token):
+    res = client.post(
+        "/users/me/avatar",
+        files={"file": ("avatar.png", b"<svg onload=alert(1)>", "image/png")},
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    assert res.status_code == 415
+
+
+def test_upload_avatar_rejects_oversized_files(client, token, monkeypatch):
+    monkeypatch.setattr(settings, "AVATAR_MAX_BYTES", 1024)
+    res = client.post(
+        "/users/me/avatar",
+        files={"file": ("avatar.png", PNG + b"\0" * 4096, "image/png")},
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    assert res.status_code == 413
+
+
 def test_set_default_avatar(client, db, admin_token):
     user = db.query(User).filter_by(email="contactuser@example.com").first()
     res = client.post(
@@ -40,3 +115,50 @@ def test_update_user_role(client, db, admin_token):
     )
     assert res.status_code == 200
     assert res.json()["email"] == user.email
+
+
+def test_update_user_role_drops_cached_principal(client, db, admin_token):
+    user = db.query(User).filter_by(email="contactuser@example.com").first()
+    res = client.patch(
+        f"/users/{user.id}/role",
+        json={"role": "user"},
+        headers={"Authorization": f"Bearer {admin_token}"}
+    )
+    assert res.status_code == 200
+    assert asyncio.run(get_user_from_cache(user.id)) is None
+
+
+def test_update_user_role_revokes_tokens(client, db, token, admin_token):
+    user = db.query(User).filter_by(email="contactuser@example.com").first()
+    res = client.patch(
+        f"/users/{user.id}/role",
+        json={"role": "user"},
+        headers={"Authorization": f"Bearer {admin_token}"}
+    )
+    assert res.status_code == 200
+    assert client.get("/users/me", headers={"Authorization": f"Bearer {token}"}).status_code == 401
+
+
+def test_admin_metrics(client, admin_token):
+    res = client.get("/admin/metrics", headers={"Authorization": f"Bearer {admin_token}"})
+    assert res.status_code == 200
+    assert "hits" in res.json()["user_cache"]["local"]
+    assert "checkouts" in res.json()["db_pool"]
+
+
+def test_admin_metrics_forbidden_for_users(client, token):
+    res = client.get("/admin/metrics", headers={"Authorization": f"Bearer {token}"})
+    assert res.status_code == 403
+
+
+def test_prometheus_metrics(client, token):
+    client.get("/contacts/", headers={"Authorization": f"Bearer {token}"})
+    res = client.get("/metrics")
+    assert res.status_code == 200
+    assert res.headers["content-type"].startswith("text/plain")
+    body = res.text
+    assert 'http_request_duration_seconds_count{method="GET",route="/contacts/"}' in body
+    assert 'http_responses_total{method="GET",route="/contacts/",status="200"}' in body
+    assert "db_queries_total" in body
+    assert 'user_cache_requests_total{layer="local",result="hit"}' in body
+    assert "password_hash_seconds_total" in body
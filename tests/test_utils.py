@@ -1,7 +1,13 @@
 import pytest
 import asyncio
+import threading
+from passlib.context import CryptContext
 from app.contacts import _to_model_kwargs
-from app.cache import get_user_from_cache
+from app.cache import get_user_from_cache, cache_user, drop_user_cache, user_cache_generation, LocalLRU
+from fastapi import HTTPException
+from app.hashing import PasswordHasher, PasswordHasherBusy
+from app.ratelimit import RateLimit
+from app.revocation import BloomFilter
 
 
 def test_to_model_kwargs():
@@ -24,3 +30,129 @@ def test_to_model_kwargs():
 async def test_get_user_from_cache_empty():
     user = await get_user_from_cache(999)
     assert user is None
+
+
+@pytest.mark.asyncio
+async def test_cache_user_roundtrip():
+    payload = {"id": 998, "email": "c@b.com", "role": "user", "is_verified": True, "avatar_url": None}
+    await cache_user(998, payload)
+    assert await get_user_from_cache(998) == payload
+
+    await drop_user_cache(998)
+    assert await get_user_from_cache(998) is None
+
+
+@pytest.mark.asyncio
+async def test_cache_user_skips_write_after_invalidation():
+    payload = {"id": 997, "email": "d@b.com", "role": "admin", "is_verified": True, "avatar_url": None}
+    generation = await user_cache_generation(997)
+    # роль змінили, поки запит читав користувача з БД
+    await drop_user_cache(997)
+    await cache_user(997, payload, generation)
+    assert await get_user_from_cache(997) is None
+
+    await cache_user(997, payload, await user_cache_generation(997))
+    assert await get_user_from_cache(997) == payload
+
+
+def test_local_lru_evicts_and_expires():
+    lru = LocalLRU(maxsize=2, ttl=60)
+    lru.set(1, "a")
+    lru.set(2, "b")
+    assert lru.get(1) == "a"
+    lru.set(3, "c")
+    assert lru.get(2) is None
+    assert lru.stats()["evictions"] == 1
+
+    expired = LocalLRU(maxsize=2, ttl=-1)
+    expired.set(1, "a")
+    assert expired.get(1) is None
+    assert expired.stats()["expired"] == 1
+
+
+def test_password_hasher_rejects_when_saturated():
+    hasher = PasswordHasher(CryptContext(schemes=["bcrypt"]), workers=1, max_pending=0)
+    with pytest.raises(PasswordHasherBusy):
+        hasher.hash("secret")
+    assert hasher.stats()["rejected"] == 1
+
+    hasher.max_pending = 1
+    assert hasher.verify("secret", hasher.hash("secret"))
+    assert hasher.stats()["completed"] == 2
+
+
+@pytest.mark.asyncio
+async def test_password_hasher_keeps_slot_until_cancelled_job_finishes():
+    hasher = PasswordHasher(CryptContext(schemes=["bcrypt"]), workers=1, max_pending=1)
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow(_):
+        started.set()
+        release.wait(5)
+        return "done"
+
+    task = asyncio.create_task(hasher._submit_async(slow, "x"))
+    await asyncio.to_thread(started.wait, 5)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    with pytest.raises(PasswordHasherBusy):
+        await hasher.hash_async("secret")
+
+    release.set()
+    await asyncio.to_thread(hasher._executor.submit(lambda: None).result)
+    assert hasher.stats()["queued"] == 0
+    assert await hasher.verify_async("secret", await hasher.hash_async("secret"))
+
+
+@pytest.mark.asyncio
+async def test_rate_limit_bucket_rejects_when_empty():
+    limit = RateLimit("test.bucket", times=2, seconds=60)
+    await limit.hit("ip:1")
+    await limit.hit("ip:1")
+    with pytest.raises(HTTPException) as exc:
+        await limit.hit("ip:1")
+    assert exc.value.status_code == 429
+    assert int(exc.value.headers["Retry-After"]) > 0
+
+    await limit.hit("ip:2")
+    assert limit.stats()["rejected"] == 1
+
+
+@pytest.mark.asyncio
+async def test_rate_limit_fail_closed_without_redis(monkeypatch):
+    from app import ratelimit
+    calls = []
+
+    async def broken_redis():
+        calls.append(1)
+        raise OSError("redis is down")
+
+    monkeypatch.setattr(ratelimit, "get_redis", broken_redis)
+    monkeypatch.setattr(ratelimit, "_redis_retry_at", 0.0)
+    monkeypatch.setattr(ratelimit.settings, "RATE_LIMIT_FAIL_OPEN", False)
+    limit = RateLimit("test.closed", times=5, seconds=60)
+    for key in ("ip:1", "ip:1", "ip:2"):
+        with pytest.raises(HTTPException) as exc:
+            await limit.hit(key)
+        assert exc.value.status_code == 503
+    # після першої помилки Redis не опитується до кінця вікна, але відмова однакова для всіх ключів
+    assert len(calls) == 1
+
+    monkeypatch.setattr(ratelimit, "_redis_retry_at", 0.0)
+    monkeypatch.setattr(ratelimit.settings, "RATE_LIMIT_FAIL_OPEN", True)
+    limit = RateLimit("test.open", times=5, seconds=60)
+    await limit.hit("ip:1")
+    await limit.hit("ip:2")
+    assert limit.stats()["sync_errors"] == 1
+    assert limit.stats()["allowed"] == 2
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(1000, 0.01)
+    for i in range(1000):
+        bloom.add(f"jti:{i}")
+    assert all(f"jti:{i}" in bloom for i in range(1000))
+    false_positives = sum(f"user:{i}" in bloom for i in range(10000))
+    assert false_positives < 300